@@ -0,0 +1,312 @@
+"""Benchmark every pipeline stage on synthetic panels of increasing size.
+
+    python -m benchmarks.run --sizes real medium --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json
+
+Each (stage, size) is run once untimed (so lazy imports and first-call caches are
+not charged to the stage), timed `--repeat` times (the minimum is kept) and run
+once more under tracemalloc for its peak memory. Stages whose cost at a size would
+be out of reach for a workstation are recorded as skipped rather than run; the
+cost limits are per stage, the report lists what they skipped, and `--no-limits`
+ignores them (at xlarge most stages are skipped, so that is the way to see where
+scaling breaks). Results are written as JSON; comparing against a saved baseline
+flags stages that became slower or larger by more than `--tolerance`, and stages
+that ran but have no baseline at a size the baseline covers. The exit status is 1
+when any did.
+The "scaling" column is the growth exponent of the time against the size of the
+work (rows × columns) since the previous size, so a jump shows where a stage
+stops scaling linearly.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_inputs, synthetic_panel, write_factor_workbook
+
+SIZES = {
+    'real': (385, 40),
+    'medium': (2000, 200),
+    'large': (20000, 500),
+    'xlarge': (100000, 2000),
+}
+MAX_LAG = 12
+MIN_SECONDS = 0.005  #Differences below these are noise, never a regression
+MIN_BYTES = 1 << 20
+
+Stage = namedtuple('Stage', ['setup', 'run', 'cost', 'max_cost'])
+
+
+def _x_columns(frame):
+    return list(frame.columns[1:])
+
+
+def _setup_excel(n_obs, n_factors, workdir):
+    path = Path(workdir) / f'factor_premia_{n_obs}x{n_factors}.xlsx'
+    write_factor_workbook(synthetic_inputs(n_obs, n_factors).factor_premia, path)
+    return path
+
+
+def _run_excel(path):
+    from factor_premia_mp.data import read_factor_premia
+    return read_factor_premia(path)
+
+
+def _run_excel_streaming(path):
+    from factor_premia_mp.workbook import read_factor_premia_streaming
+    return read_factor_premia_streaming(path)
+
+
+def _setup_csv(n_obs, n_factors, workdir):
+    path = Path(workdir) / f'monthly_full_df_{n_obs}x{n_factors}.csv'
+    synthetic_panel(n_obs, n_factors).to_csv(path)
+    return path
+
+
+def _run_csv(path):
+    return pd.read_csv(path, index_col='Date', parse_dates=['Date'])
+
+
+def _setup_store(n_obs, n_factors, workdir):
+    from factor_premia_mp.panel_store import write_panel
+    path = Path(workdir) / f'monthly_full_df_{n_obs}x{n_factors}.panel'
+    write_panel(synthetic_panel(n_obs, n_factors), path)
+    return path
+
+
+def _run_store(path):
+    from factor_premia_mp.panel_store import open_panel
+    return open_panel(path).frame()
+
+
+def _run_stance(inputs):
+    from factor_premia_mp.stance import build_mp_stance
+    return build_mp_stance(inputs.ffr, inputs.rstar, inputs.spf, inputs.ffr['observation_date'].iloc[0])
+
+
+def _setup_merge(n_obs, n_factors, workdir):
+    inputs = synthetic_inputs(n_obs, n_factors)
+    return _run_stance(inputs), inputs.factor_premia, inputs.freq
+
+
+def _run_merge(arguments):
+    from factor_premia_mp.panel import merge_stance_factors
+    mp_stance, factor_premia, freq = arguments
+    return merge_stance_factors(mp_stance, factor_premia, freq)
+
+
+def _run_ols(frame):
+    import statsmodels.api as sm
+    return sm.OLS(frame['MPSTANCE'], sm.add_constant(frame[_x_columns(frame)])).fit()
+
+
+def _run_stepwise(frame):
+    from factor_premia_mp.stepwise import StepwiseSelector
+    return StepwiseSelector(k_features='best', forward=True, scoring='r2', cv=0).fit(
+        frame[_x_columns(frame)], frame['MPSTANCE'])
+
+
+def _run_granger(frame):
+    from factor_premia_mp.lag_search import find_best_lags
+    return find_best_lags(_x_columns(frame), 'MPSTANCE', frame, max_lag=MAX_LAG)
+
+
+def _run_vif(frame):
+    from factor_premia_mp.diagnostics import collinearity_diagnostics
+    return collinearity_diagnostics(frame[_x_columns(frame)])
+
+
+def _store_panel(n_obs, n_factors, workdir):
+    from factor_premia_mp.panel_store import open_panel
+    return open_panel(_setup_store(n_obs, n_factors, workdir))
+
+
+def _setup_lagged(n_obs, n_factors, workdir):
+    frame = synthetic_panel(n_obs, n_factors)
+    lags = np.random.default_rng(0).integers(1, MAX_LAG + 1, size=n_factors)
+    return frame, pd.DataFrame({'Column': _x_columns(frame), 'Best Lag': lags})
+
+
+def _run_lagged(arguments):
+    from factor_premia_mp.design import LaggedDesign
+    frame, lag_results = arguments
+    return LaggedDesign(frame, lag_results, y_variable='MPSTANCE').to_frame(include_y=True)
+
+
+def _panel(n_obs, n_factors, workdir):
+    return synthetic_panel(n_obs, n_factors)
+
+
+def _inputs(n_obs, n_factors, workdir):
+    return synthetic_inputs(n_obs, n_factors)
+
+
+#cost(n_obs, n_factors) is a rough operation count; sizes above max_cost are skipped
+STAGES = {
+    'ingest_excel': Stage(_setup_excel, _run_excel, lambda n, k: n * k, 2e6),
+    'ingest_excel_streaming': Stage(_setup_excel, _run_excel_streaming, lambda n, k: n * k, 2e6),
+    'ingest_csv': Stage(_setup_csv, _run_csv, lambda n, k: n * k, 5e7),
+    'ingest_store': Stage(_setup_store, _run_store, lambda n, k: n * k, 5e8),
+    'stance': Stage(_inputs, _run_stance, lambda n, k: n, 1e8),
+    'merge': Stage(_setup_merge, _run_merge, lambda n, k: n * k, 5e7),
+    'ols': Stage(_panel, _run_ols, lambda n, k: n * k * k, 1e11),
+    'stepwise': Stage(_panel, _run_stepwise, lambda n, k: n * k * k, 1e10),
+    'granger': Stage(_panel, _run_granger, lambda n, k: n * k * MAX_LAG, 5e7),
+    'vif': Stage(_panel, _run_vif, lambda n, k: n * k * k, 1e11),
+    'vif_store': Stage(_store_panel, _run_vif, lambda n, k: n * k * k, 1e11),
+    'lagged_frame': Stage(_setup_lagged, _run_lagged, lambda n, k: n * k, 5e7),
+}
+
+
+def _time(run, arguments, repeat):
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run(arguments)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def _peak_bytes(run, arguments):
+    tracemalloc.start()
+    try:
+        run(arguments)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmarks(sizes, stages, repeat=3, limits=True, workdir=None):
+    """One record per (stage, size): status "ok" with timings and peak memory, or "skipped"."""
+    records = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in sizes:
+            n_obs, n_factors = SIZES[size]
+            for name in stages:
+                stage = STAGES[name]
+                record = {'stage': name, 'size': size, 'n_obs': n_obs, 'n_columns': n_factors}
+                cost = stage.cost(n_obs, n_factors)
+                if limits and cost > stage.max_cost:
+                    records.append(dict(record, status='skipped', cost=cost, max_cost=stage.max_cost))
+                    continue
+                arguments = stage.setup(n_obs, n_factors, tmp)
+                stage.run(arguments)  #Warm-up: imports and one-off initialization
+                seconds = _time(stage.run, arguments, repeat)
+                records.append(dict(record, status='ok', seconds=min(seconds), median_seconds=float(np.median(seconds)),
+                                    peak_bytes=_peak_bytes(stage.run, arguments)))
+                print(f'{name:>13} {size:>7}: {min(seconds):9.4f} s', file=sys.stderr)
+    return records
+
+
+def _environment():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+    }
+
+
+def results_frame(records):
+    """Records as a frame indexed by (stage, size), with the scaling exponent between sizes."""
+    frame = pd.DataFrame(records).set_index(['stage', 'size'])
+    work = frame['n_obs'] * frame['n_columns']
+    scaling = pd.Series(np.nan, index=frame.index)
+    for stage, group in frame.groupby(level='stage', sort=False):
+        done = group[group['status'] == 'ok']
+        growth = np.log(done['seconds']).diff() / np.log(work[done.index]).diff()
+        scaling[done.index] = growth
+    return frame.assign(scaling=scaling)
+
+
+def compare(records, baseline, tolerance=0.25):
+    """Rows of (stage, size) whose time or peak memory grew by more than `tolerance` over `baseline`."""
+    current = results_frame(records)
+    previous = results_frame(baseline['results'])
+    both = current.join(previous, rsuffix='_baseline', how='inner')
+    both = both[(both['status'] == 'ok') & (both['status_baseline'] == 'ok')]
+
+    slower = ((both['seconds'] > both['seconds_baseline'] * (1 + tolerance))
+              & (both['seconds'] - both['seconds_baseline'] > MIN_SECONDS))
+    larger = ((both['peak_bytes'] > both['peak_bytes_baseline'] * (1 + tolerance))
+              & (both['peak_bytes'] - both['peak_bytes_baseline'] > MIN_BYTES))
+    regressions = both.loc[slower | larger, ['seconds', 'seconds_baseline', 'peak_bytes', 'peak_bytes_baseline']]
+    return regressions.assign(time_ratio=regressions['seconds'] / regressions['seconds_baseline'],
+                              memory_ratio=regressions['peak_bytes'] / regressions['peak_bytes_baseline'])
+
+
+def missing_from_baseline(records, baseline):
+    """(stage, size) pairs that ran now, at a size the baseline covers, without a baseline result."""
+    covered = {result['size'] for result in baseline['results']}
+    measured = {(result['stage'], result['size']) for result in baseline['results'] if result['status'] == 'ok'}
+    return [(record['stage'], record['size']) for record in records
+            if record['status'] == 'ok' and record['size'] in covered
+            and (record['stage'], record['size']) not in measured]
+
+
+def _skipped_note(records):
+    skipped = [record for record in records if record['status'] == 'skipped']
+    if not skipped:
+        return None
+    by_size = {}
+    for record in skipped:
+        by_size.setdefault(record['size'], []).append(record['stage'])
+    lines = [f'  {size}: {", ".join(stages)}' for size, stages in by_size.items()]
+    return '\n'.join([f'{len(skipped)} runs skipped by the cost limits (run them with --no-limits):'] + lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='benchmarks.run', description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=list(SIZES))
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage and size')
+    parser.add_argument('--no-limits', action='store_true', help='run stages even above their cost limit')
+    parser.add_argument('--save', type=Path, help='write the results as a JSON baseline')
+    parser.add_argument('--compare', type=Path, help='baseline JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative growth before flagging')
+    parser.add_argument('--workdir', type=Path, help='where temporary input files are written')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    records = run_benchmarks(args.sizes, args.stages, args.repeat, not args.no_limits, args.workdir)
+
+    columns = ['n_obs', 'n_columns', 'status', 'seconds', 'peak_bytes', 'scaling']
+    print(results_frame(records)[columns].to_string())
+    note = _skipped_note(records)
+    if note:
+        print(f'\n{note}')
+
+    if args.save:
+        args.save.parent.mkdir(parents=True, exist_ok=True)
+        args.save.write_text(json.dumps({'environment': _environment(), 'results': records}, indent=1))
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(records, baseline, args.tolerance)
+        missing = missing_from_baseline(records, baseline)
+        if missing:
+            print(f'\nNo baseline in {args.compare} for: ' + ', '.join(f'{stage} ({size})' for stage, size in missing))
+            print('Regenerate it with --save.')
+        if len(regressions):
+            print(f'\nRegressions against {args.compare}:')
+            print(regressions.to_string())
+        if missing or len(regressions):
+            return 1
+        print(f'\nNo regressions against {args.compare}.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
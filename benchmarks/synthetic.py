@@ -0,0 +1,91 @@
+"""Synthetic inputs shaped like the real ones, at any size.
+
+`synthetic_inputs` gives the four loader outputs (fed funds, r-star, SPF, factor
+premia) for `n_obs` periods and `n_factors` factor columns, so every stage of the
+pipeline can run on them unchanged. Dates are monthly while they fit in pandas'
+nanosecond range and daily beyond that; `freq` says which, for the merge.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp import panel, stance
+
+SyntheticInputs = namedtuple('SyntheticInputs', ['ffr', 'rstar', 'spf', 'factor_premia', 'freq'])
+
+MONTHLY_START = '1991-10-01'
+DAILY_START = '1800-01-01'
+MAX_MONTHS = 3000  #1991-10 + 3000 months is still before pd.Timestamp.max
+
+
+def _dates(n_obs):
+    if n_obs <= MAX_MONTHS:
+        return pd.date_range(MONTHLY_START, periods=n_obs, freq='MS'), 'M'
+    return pd.date_range(DAILY_START, periods=n_obs, freq='D'), 'D'
+
+
+def _ar1(rng, shape, phi, scale):
+    """AR(1) paths along axis 0."""
+    shocks = rng.normal(scale=scale, size=shape)
+    paths = np.empty(shape)
+    paths[0] = shocks[0]
+    for t in range(1, shape[0]):
+        paths[t] = phi * paths[t - 1] + shocks[t]
+    return paths
+
+
+def synthetic_panel(n_obs, n_factors, seed=0):
+    """`monthly_full_df` lookalike: MPSTANCE plus `n_factors` factor columns, indexed by "Date".
+
+    Factor premia are monthly-return-sized noise sharing a few common factors, and
+    MPSTANCE is persistent with a weak dependence on lagged factors, so the lag
+    search and the regressions have something to find.
+    """
+    inputs = synthetic_inputs(n_obs, n_factors, seed)
+    start = inputs.ffr['observation_date'].iloc[0]
+    mp_stance = stance.build_mp_stance(inputs.ffr, inputs.rstar, inputs.spf, start)
+    return panel.merge_stance_factors(mp_stance, inputs.factor_premia, inputs.freq)
+
+
+def synthetic_inputs(n_obs, n_factors, seed=0):
+    """The four cleaned inputs in the layouts `factor_premia_mp.data` returns."""
+    rng = np.random.default_rng(seed)
+    dates, freq = _dates(n_obs)
+
+    n_common = min(5, n_factors)
+    loadings = rng.normal(scale=0.5, size=(n_common, n_factors))
+    common = rng.normal(scale=0.02, size=(n_obs, n_common))
+    premia = common @ loadings + rng.normal(scale=0.02, size=(n_obs, n_factors))
+    names = [f'Factor {i}' for i in range(n_factors)]
+    factor_premia = pd.DataFrame(premia, columns=names)
+    factor_premia.insert(0, 'Date', dates)
+
+    #Fed funds: persistent level plus a small response to lagged premia
+    signal = np.zeros(n_obs)
+    signal[3:] = premia[:-3, :n_common].sum(axis=1)
+    ffr = pd.DataFrame({'observation_date': dates, 'FEDFUNDS': 3 + _ar1(rng, (n_obs,), 0.98, 0.2) + 5 * signal})
+
+    quarters = dates[dates.month.isin([1, 4, 7, 10]) & (dates.day == 1)]
+    rstar = pd.DataFrame({'Date': quarters, 'RSTAR': 1 + _ar1(rng, (len(quarters),), 0.95, 0.1)})
+    spf = pd.DataFrame({
+        'YEAR': quarters.year.astype('int64'),
+        'QUARTER': ((quarters.month - 1) // 3 + 1).astype('int64'),
+        'INFCPI10YR': 2.5 + _ar1(rng, (len(quarters),), 0.9, 0.05),
+    })
+    return SyntheticInputs(ffr, rstar, spf, factor_premia, freq)
+
+
+def write_factor_workbook(factor_premia, path, header_row=17):
+    """Write `factor_premia` in the Century of Factor Premia layout `read_factor_premia` expects.
+
+    A title line, blank filler, and the column headers on row `header_row` of the frame
+    pandas reads (the title line becomes that frame's header).
+    """
+    width = factor_premia.shape[1]
+    filler = [['Century of Factor Premia'] + [None] * (width - 1)]
+    filler += [[None] * width for _ in range(header_row)]
+    header = [['Date'] + list(factor_premia.columns[1:])]
+    body = factor_premia.astype(object).values.tolist()
+    pd.DataFrame(filler + header + body).to_excel(path, header=False, index=False)
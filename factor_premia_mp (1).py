@@ -13,22 +13,19 @@ Original file is located at
 
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import statsmodels.api as sm
-from statsmodels.tsa.stattools import grangercausalitytests
-from sklearn.linear_model import LinearRegression
-from mlxtend.feature_selection import SequentialFeatureSelector
+from factor_premia_mp.stepwise import StepwiseSelector
+from factor_premia_mp import data, panel, stance
+from factor_premia_mp.pipeline import INPUT_FILES
+from factor_premia_mp.memo import MemoCache
 
-pip install xlrd
+#The workbooks are read from a local directory (the repository root by default) instead of a mounted Drive;
+#the same stages run headless with "python -m factor_premia_mp all --data-dir <dir>"
+DATA_DIR = "."
 
-pip install openpyxl
-
-import xlrd
-import openpyxl
-
-from google.colab import drive
-drive.mount('/content/drive')
+#Granger tables and selector fits are cached on disk by the content of their inputs, so reruns
+#(and the repeated fits on the same lagged_X below) only compute what has changed
+memo = MemoCache()
 
 """# **Data Cleaning**
 
@@ -44,7 +41,7 @@ Following that formula, we must merge those three components: $FF_t$, $RFF_t^*$,
 ## A. Federal Funds Rate
 """
 
-ffr = pd.read_excel('/content/drive/MyDrive/fedfunds.xls')
+ffr = data.load_fedfunds(f"{DATA_DIR}/{INPUT_FILES['fedfunds']}")   #Parsed once, then read from the cached snapshot
 ffr.head()
 
 """What is the data type of the feature (1) "FEDFUNDS" and (2) observation_date? Question (1) is important because the federal funds raet is an element of the calculation of the stance of monetary policy. Question (2) is also vital becuase to merge this dataset with others, the dates have to be standardized."""
@@ -59,9 +56,7 @@ ffr.dtypes  #Check data type
 """
 
 #R star
-rff = pd.read_excel('/content/drive/MyDrive/r_star.xlsx')
-
-rff.rename(columns={'rstar': 'RSTAR'}, inplace=True)  #Match format and style of column title to other dataframes
+rff = data.load_rstar(f"{DATA_DIR}/{INPUT_FILES['rstar']}")  #"rstar" is renamed to "RSTAR" to match the other dataframes
 rff.tail()
 
 """For similar reasons as for the federal funds rate, for the component $FF^*$, we must check the data type of "RSTAR" and "Date."
@@ -75,7 +70,7 @@ rff.dtypes  #Check data type
 """
 
 #SPF 10 year inflation expectations
-spf_10yr_inflation_exp = pd.read_excel('/content/drive/MyDrive/spf_10_yr_inflation_expectation.xlsx')
+spf_10yr_inflation_exp = data.load_spf(f"{DATA_DIR}/{INPUT_FILES['spf']}")
 spf_10yr_inflation_exp.tail(10)
 
 """As for the other datasets, we must check the datatypes."""
@@ -93,14 +88,8 @@ All datasets but "spf_10yr_inflation_exp" have monthly frequency. Monthly freque
 To achieve such a purpose, the "Date" column must be one and have a format similar to monthly frequency.
 """
 
-months_dict = {1: '-01-01', 2: '-04-01', 3: '-07-01', 4: '-10-01'}  #Set dictionary that converts the quarters into month format
-
-# Create "Date" column in monthly frequency
-spf_10yr_inflation_exp['Date'] = spf_10yr_inflation_exp.apply(
-    lambda row: pd.to_datetime(str(int(row['YEAR'])) + months_dict[int(row['QUARTER'])]), axis=1
-)
-
-spf_10yr_inflation_exp = spf_10yr_inflation_exp.drop(["YEAR", "QUARTER"], axis=1)     #Drop irrelevant columns
+# Create "Date" column in monthly frequency (first month of each quarter) and drop "YEAR" and "QUARTER"
+spf_10yr_inflation_exp = stance.spf_with_dates(spf_10yr_inflation_exp)
 
 spf_10yr_inflation_exp.tail(10)
 
@@ -117,19 +106,9 @@ With the dates standardized across all datasets, they can be merged. Since rff a
 first_non_nan_row = spf_10yr_inflation_exp.loc[spf_10yr_inflation_exp['INFCPI10YR'].notna()].iloc[0]
 print(first_non_nan_row)
 
-#Drop all rows before 1991-10-01 in ffr dataset
-ffr_filtered = ffr.loc[ffr["observation_date"] >= pd.to_datetime("1991-10-01")]
-
-mp_stance = pd.merge(ffr_filtered, rff, left_on="observation_date", right_on="Date", how="left")
-mp_stance["observation_date"] = pd.to_datetime(mp_stance["observation_date"] )
-mp_stance['RSTAR'].fillna(method='ffill', inplace=True)   #Replace NaN values with forward fill
-mp_stance = mp_stance.drop("Date", axis=1)
-
-mp_stance.head(10)
-
-mp_stance = pd.merge(mp_stance, spf_10yr_inflation_exp, left_on="observation_date", right_on="Date", how="left")
-mp_stance['INFCPI10YR'].fillna(method='ffill', inplace=True)   #Replace NaN values with forward fill
-mp_stance = mp_stance.drop("Date", axis=1)
+#Drop all rows before 1991-10-01 in ffr dataset, then carry the latest RSTAR and INFCPI10YR forward
+#to every federal funds date with a single sorted as-of lookup (same as a left merge plus forward fill)
+mp_stance = stance.build_mp_stance(ffr, rff, spf_10yr_inflation_exp, start="1991-10-01", keep_components=True)
 
 mp_stance.tail(10)
 
@@ -140,45 +119,15 @@ mp_stance.tail(10)
 Currenlty, the merged datast has all of the necessary components to calculate the monetary policy stance without the variable itself.
 """
 
-mp_stance["MPSTANCE"] = mp_stance["FEDFUNDS"] - (mp_stance["RSTAR"] + mp_stance["INFCPI10YR"])    #Use formula
-
+#build_mp_stance has already applied the formula: MPSTANCE = FEDFUNDS - (RSTAR + INFCPI10YR)
 mp_stance = mp_stance.drop(["FEDFUNDS", "RSTAR", "INFCPI10YR"], axis=1)   #Drop irrelevant columns
-mp_stance["observation_date"] = mp_stance["observation_date"].dt.strftime("%b-%Y") #Set month-year format to prepare for the merging with the x-variables
 
 mp_stance.head(10)
 
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import matplotlib.dates as mdates
-
-sns.set(style='ticks')
-
-mp_stance_graph = mp_stance.copy()
-
-if not pd.api.types.is_datetime64_dtype(mp_stance_graph['observation_date']):
-    mp_stance_graph['observation_date'] = pd.to_datetime(mp_stance_graph['observation_date'])
-
-fig, ax = plt.subplots(figsize=(10, 6))
+from factor_premia_mp.plotting import plot_mp_stance   #matplotlib and seaborn are only imported here
 
-sns.lineplot(data=mp_stance_graph, x='observation_date', y='MPSTANCE', ax=ax, linewidth=2)
-
-ax.axhline(0, color='black', linewidth=1.5, linestyle='--')
-ax.yaxis.set_tick_params(width=1.5, color='black')
-
-# Set x-axis limits to 1991 and 2023:
-ax.set_xlim([pd.to_datetime('1991-01-01'), pd.to_datetime('2023-12-31')])
-
-# Adjust for yearly display with 5-year intervals:
-ax.xaxis.set_major_locator(mdates.YearLocator(base=5))
-ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter("%Y %% 5"))
-plt.xticks(rotation=45, ha='right')  # Rotate for readability
-ax.set_xlabel('Year')
-
-ax.set_title("A Measure of Stance of Monetary Policy")
-ax.set_ylabel('Percentage (%)')
-fig.tight_layout()
-plt.show()
+fig = plot_mp_stance(mp_stance)
+fig
 
 """As seeen from the graph above, the measure of the stance of monetary policy matches with the original source, confirming the accuracy of the MPSTANCE as a variable.
 
@@ -189,14 +138,9 @@ plt.show()
 Ilmanen (2019) publish and update a dataset of factor premia across different asset classes. The first 30 rows of the uploaded dataset show empty values and unnamed column names.
 """
 
-factor_premia = pd.read_excel('/Century of Factor Premia Monthly.xlsx')
-factor_premia.head(30)
-
-#Fix the shape of the dataframe
-
-#Set columns
-factor_premia.columns = factor_premia.iloc[17]  #Column headers
-clean_factor_premia = factor_premia[18:]
+#The loader fixes the shape of the dataframe (row 17 as column headers, data from row 18),
+#casts the factor premia to float and names the date column "Date"; the result is cached as a snapshot
+clean_factor_premia = data.load_factor_premia(f"{DATA_DIR}/{INPUT_FILES['factor_premia']}")
 
 clean_factor_premia.tail(10)
 
@@ -204,27 +148,16 @@ clean_factor_premia.tail(10)
 
 ### B. Change: Change Data Type
 
-To conduct regressions, factor premia have to be float. Currently, their data type is "object."
+To conduct regressions, factor premia have to be float. In the raw workbook, their data type is "object," so the loader casts every factor column to float.
 """
 
 clean_factor_premia.dtypes
 
-for column in clean_factor_premia.columns[1:]:
-    clean_factor_premia[column] = clean_factor_premia[column].astype(float)
-
-clean_factor_premia.dtypes
-
 """Now, X-variables have float type. So, regression analysis can be conducted.
 
 After making the factor premia dataset legible and preparing it for regression analysis, can it be merged with the monetary policy stance as a y-variable?
 """
 
-clean_factor_premia.rename(columns={clean_factor_premia.columns[0]: "Date"}, inplace=True)    #Set clear title for column of dates
-clean_factor_premia["Date"] = pd.to_datetime(clean_factor_premia["Date"])   #Set in standardized format (datetime)
-# clean_factor_premia = clean_factor_premia.drop('Date_month_year', axis=1)
-
-clean_factor_premia.dtypes
-
 """Without a clear name and standardized format for the dates, merging and understanding the datasest will be hard.
 
 ## III. Merging Factor Premia and Stance of MP
@@ -232,20 +165,11 @@ clean_factor_premia.dtypes
 The two datasets - mp_stance and clean_factor_premia - will be merged at their respectve columns for dates. How compatible are the dates?
 """
 
-#Ensure they have the same data type
-mp_stance["observation_date"] = pd.to_datetime(mp_stance["observation_date"])
-clean_factor_premia["Date"] = pd.to_datetime(clean_factor_premia["Date"])
-
-#Set them as month-year only (days can differ)
-mp_stance["observation_month_year"] = mp_stance["observation_date"].dt.strftime("%b-%Y")
-clean_factor_premia["Date_month_year"] = clean_factor_premia["Date"].dt.strftime("%b-%Y")
-
+#Both date columns are datetime; match them by month only (days can differ) using integer month keys
+#(months since 1970) rather than month-year strings
 """Now, both datasets can be merged."""
 
-monthly_full_df = pd.merge(mp_stance, clean_factor_premia, left_on="observation_month_year", right_on="Date_month_year", how='inner')
-
-monthly_full_df.set_index(monthly_full_df["Date"], inplace=True)  #Set the dates as index for regression analysis
-monthly_full_df = monthly_full_df.drop(['observation_date', 'observation_month_year', 'Date', 'Date_month_year'], axis=1)
+monthly_full_df = panel.merge_stance_factors(mp_stance, clean_factor_premia, freq='M')   #Indexed by "Date" for regression analysis
 
 monthly_full_df.head(10)
 
@@ -309,6 +233,12 @@ ols_model = sm.OLS(y, X).fit()
 
 print(ols_model.summary())
 
+from factor_premia_mp.regression import window_panel
+
+#Same regression over rolling 60- and 120-month windows and an expanding window
+ols_windows = window_panel(monthly_full_df, "MPSTANCE", monthly_factor_asset_X.columns, windows=(60, 120, None))
+ols_windows.fit.groupby(level="window").tail(1)
+
 """For this reason, we implement OLS regression. To assess the appropriatedness of OLS regression, we examine r-squared. It is at 7.8%, hinting that, perhaps, OLS regression may be inappropriate.
 
 ### **B. Stepwise Regression**
@@ -318,15 +248,12 @@ Perhaps, OLS regression did not seem to be the best statistical method because i
 
 X = sm.add_constant(X)
 
-estimator = LinearRegression()
-
-# Run stepwise regression
-stepwise_selector = SequentialFeatureSelector(estimator=estimator,
-                                              k_features='best',
-                                              forward=True,
-                                              scoring='r2',
-                                              cv=0)   #Number of folds
-stepwise_selector.fit(X, y)
+# Run stepwise regression (each candidate is scored with a rank-one update instead of a refit)
+stepwise_selector = StepwiseSelector(k_features='best',
+                                     forward=True,
+                                     scoring='r2',
+                                     cv=0)   #Number of folds
+stepwise_selector = memo.call(stepwise_selector.fit, X, y)
 selected_features = list(stepwise_selector.k_feature_names_)
 dropped_features = list(set(X.columns) - set(selected_features))
 
@@ -349,83 +276,68 @@ else:
 An alternative explanation can be lagged effects. To test this theory, we try to find the most optimal number of lags for each explanatory variable.
 """
 
-def find_best_lags(x_columns, y_variable, data_frame):
-    results = []
-
-    for column in x_columns:
-        best_lag = None
-        best_p_value = float('inf')
-        x_values = data_frame[column].values
-        y_values = data_frame[y_variable].values
-
-        for lag in range(1, 13):
-            test_data = pd.DataFrame({'x': x_values, 'y': y_values})
-
-            # Perform Granger causality test
-            results_dict = grangercausalitytests(test_data, maxlag=lag, verbose=False)
-            p_value = results_dict[lag][0]['params_ftest'][1]
-
-            if p_value < best_p_value:
-                best_lag = lag
-                best_p_value = p_value
-
-        results.append({'Column': column, 'Best Lag': best_lag})
-
-    results_df = pd.DataFrame(results)
-    return results_df
+from factor_premia_mp.lag_search import find_best_lags   #Batched Granger F-tests for all columns and lags at once
 
 lagged_X = [col for col in monthly_factor_asset_X.columns if col != "MPSTANCE"]
 lagged_y = "MPSTANCE"
 
-lag_results = find_best_lags(lagged_X, lagged_y, monthly_full_df)
+lag_results = memo.call(find_best_lags, lagged_X, lagged_y, monthly_full_df)
 print(lag_results)
 
-"""These lag values can help create a new dataframe that can potentially better understand monetary policy stance. How can we create such a dataset?"""
-
-def create_lagged_dataframe(x_columns, y_variable, data_frame):
-    results = []
-
-    for column in x_columns:
-        best_lag = None
-        best_p_value = float('inf')
-        x_values = data_frame[column].values
-        y_values = data_frame[y_variable].values
-
-        test_data = pd.DataFrame({'x': x_values, 'y': y_values})
-
-        # Run Granger causality test with the maximum lag value as 12
-        results_dict = grangercausalitytests(test_data, maxlag=12, verbose=False)
-
-        for lag, result in results_dict.items():
-            p_value = result[0]['params_ftest'][1]
-            if p_value < best_p_value:
-                best_lag = lag
-                best_p_value = p_value
-
-        results.append({'Column': column, 'Best_Lag': best_lag})
-
-    results_df = pd.DataFrame(results)
+from factor_premia_mp.lag_search import bidirectional_best_lags
+
+#Test both directions of the potential feedback loop: MPSTANCE lags added to each factor's own lags
+#(the direction used by find_best_lags) and factor lags added to MPSTANCE's own lags
+feedback_lags = bidirectional_best_lags(lagged_X, lagged_y, monthly_full_df)
+print(feedback_lags)
+
+from factor_premia_mp.lag_specification import search_lag_specifications
+
+#Instead of one lag per factor chosen column by column, search jointly over specifications with up to two lags
+#per factor, scored by the AIC of the joint OLS on a common sample (greedy additions and removals)
+lag_specification = search_lag_specifications(monthly_full_df, lagged_X, lagged_y, criterion="aic", max_lags_per_column=2)
+print(f"AIC of the joint specification: {lag_specification.score:.2f}")
+lag_specification.lags
+
+from factor_premia_mp import scenarios
+
+#How sensitive are the results to the definition of the stance? Every scenario is one column of a stance
+#matrix; the OLS and the lag search then run on all of them at once over a common sample. Other rates,
+#r-star estimates or inflation horizons can be added to `components` as date-indexed Series. "linear"
+#interpolation would use next quarter's r-star and inflation expectation and leak the future into the Granger
+#tests, so the alternative fill is "linear_lagged", which only moves toward values already published
+components = scenarios.components_from_inputs(ffr, rff, spf_10yr_inflation_exp)
+stance_scenarios = scenarios.scenario_grid(fills=("ffill", "linear_lagged"))
+scenario_stance, scenario_factors = scenarios.merge_scenarios(scenarios.stance_matrix(components, stance_scenarios),
+                                                              clean_factor_premia)
+scenario_fit = scenarios.scenario_ols(scenario_stance, scenario_factors[lagged_X])
+print(scenario_fit.fit)
+scenarios.scenario_best_lags(scenario_stance, scenario_factors[lagged_X]).pivot(index="Column", columns="Scenario", values="Best Lag")
+
+from factor_premia_mp.var import local_projections
+
+#Response of a few factor premia over the next 24 months to a one-point higher MPSTANCE, controlling for
+#2 lags of each series (all equations and horizons in one stacked solve). The system is kept small: every
+#factor with 12 lags would put over 300 regressors on fewer than 375 rows, and the Multi-style columns are
+#combinations of the other styles
+projection_factors = ["Equity indices Value", "Fixed income Momentum", "Currencies Carry"]
+stance_projections = local_projections(monthly_full_df[[lagged_y] + projection_factors], shock=lagged_y,
+                                       responses=projection_factors, horizon=24, lags=2)
+stance_projections.xs(projection_factors[0], level="response")
 
-    # Create lagged DataFrame
-    lagged_df = pd.DataFrame()
-    for row in results_df.itertuples():
-        column_name = row.Column
-        lag = row.Best_Lag
-        lagged_df[f'{column_name}_lag{lag}'] = data_frame[column_name].shift(lag)
-
-    return lagged_df
+"""These lag values can help create a new dataframe that can potentially better understand monetary policy stance. How can we create such a dataset?"""
 
-lagged_monthly_factor_asset = create_lagged_dataframe(lagged_X, lagged_y, monthly_full_df)
+from factor_premia_mp.design import LaggedDesign
 
-lagged_monthly_factor_asset
+# Each "<column>_lag<lag>" column is a view into one buffer of monthly_full_df, shifted by its best lag
+lagged_design = LaggedDesign(monthly_full_df, lag_results, y_variable="MPSTANCE")
 
-"""Dataset has missing values when incorporating lagged values. So, we drop the first few rows with the amount being the largest lag value, explaining the importance of "lag_results" table.  """
+"""Dataset has missing values when incorporating lagged values. So, we drop the first few rows with the amount being the largest lag value, explaining the importance of "lag_results" table. The lagged design does this trimming automatically."""
 
 # Find the largest lag value
-largest_lag = lag_results['Best Lag'].max()
+largest_lag = lagged_design.max_lag
 
-# Drop rows given largest lag for lagged_monthly_factor_asset to not have missing values
-lagged_monthly_factor_asset = lagged_monthly_factor_asset.iloc[largest_lag:]
+lagged_monthly_factor_asset = lagged_design.to_frame()
 
 lagged_monthly_factor_asset
 
@@ -439,8 +351,7 @@ if no_na_in_first_row:
 else:
     print("NaN values present in the first row after dropping the largest lag value.")
 
-lag_df = pd.merge(monthly_full_df["MPSTANCE"], lagged_monthly_factor_asset, left_on=monthly_full_df.index, right_on = lagged_monthly_factor_asset.index, how="inner")
-lag_df = lag_df.drop(['key_0'], axis=1)
+lag_df = lagged_design.to_frame(include_y=True)   #MPSTANCE followed by the lagged factor premia
 lag_df
 
 """###**A. OLS Regression**
@@ -461,6 +372,15 @@ lag_ols = sm.OLS(lagged_y, lagged_X).fit()
 # Print the summary statistics
 print(lag_ols.summary())
 
+from factor_premia_mp.resampling import bootstrap_ols, permutation_test_ols
+
+#Monthly premia are serially correlated: check the OLS p-values with a stationary block bootstrap
+#(12-month mean blocks) and a block permutation test of MPSTANCE
+lag_bootstrap = bootstrap_ols(lagged_y, lag_df.iloc[:, 1:], n_reps=2000, block_length=12, seed=0)
+lag_permutation = permutation_test_ols(lagged_y, lag_df.iloc[:, 1:], n_reps=2000, block_length=12, seed=0)
+
+lag_bootstrap.summary.join(lag_permutation.summary["p_value"], rsuffix="_permutation")
+
 """### **B. Stepwise Regression**
 
 When considering lagged effects in stepwise regression, the model does not drop any features, yet the r-squared largely increased from 7.8% to 26.3% and adjusted r-squared increased from 1.1% to 20.3% without any number of folds.
@@ -468,19 +388,16 @@ When considering lagged effects in stepwise regression, the model does not drop
 
 import pandas as pd
 import statsmodels.api as sm
-from mlxtend.feature_selection import SequentialFeatureSelector
+from factor_premia_mp.stepwise import StepwiseSelector
 
-estimator = LinearRegression()
-
-stepwise_selector = SequentialFeatureSelector(
-    estimator=estimator,
+stepwise_selector = StepwiseSelector(
     k_features='best',
     forward=True,
     scoring='r2',
     cv=0  #Number of folds
 )
 
-stepwise_selector.fit(lagged_X, lagged_y)
+stepwise_selector = memo.call(stepwise_selector.fit, lagged_X, lagged_y)
 
 selected_features = list(stepwise_selector.k_feature_names_)
 dropped_features = list(set(lagged_X.columns) - set(selected_features))
@@ -504,18 +421,16 @@ Why did r-squared improve significantly when stepwise regression did not drop an
 
 lagged_X = lag_df.iloc[:, 1:]
 
-import pandas as pd
-import numpy as np
-from statsmodels.stats.outliers_influence import variance_inflation_factor
-
-vif_scores = pd.DataFrame()
-vif_scores["VIF Factor"] = [variance_inflation_factor(lagged_X.values, i) for i in range(lagged_X.shape[1])]
-vif_scores["Feature"] = lagged_X.columns
+from factor_premia_mp.diagnostics import collinearity_diagnostics
 
-vif_scores.set_index('Feature', inplace=True)
+#Every VIF at once from the inverse of the scaled cross-product matrix (same values as variance_inflation_factor)
+collinearity = collinearity_diagnostics(lagged_X)
+vif_scores = collinearity.vif
 
 vif_scores
 
+print(f"Condition number: {collinearity.condition_number:.2f}")
+
 """The above results show that collinearity is a concern for some features - "US Stock Selection Momentum_lag6" and "Intl Stock Selection Momentum_lag6" - but for most features, collinearity is not an issue since their VIF is less than 5.
 
 ### **B. Overfitting**
@@ -523,17 +438,14 @@ vif_scores
 An alternative explanation for such a sharp improvement in r-squared is overfitting. To what extent can that be an explanation?
 """
 
-estimator = LinearRegression()
-
-stepwise_selector = SequentialFeatureSelector(
-    estimator=estimator,
+stepwise_selector = StepwiseSelector(
     k_features='best',
     forward=True,
     scoring='r2',
     cv=5  # Change number of folds
 )
 
-stepwise_selector.fit(lagged_X, lagged_y)
+stepwise_selector = memo.call(stepwise_selector.fit, lagged_X, lagged_y)
 
 selected_features = list(stepwise_selector.k_feature_names_)
 dropped_features = list(set(lagged_X.columns) - set(selected_features))
@@ -557,3 +469,21 @@ else:
 
 
 
+
+from functools import partial
+from factor_premia_mp.validation import cross_validate_ols, cross_validate_stepwise, purged_splits, walk_forward_splits
+
+#K-fold mixes future months into the training sets of monthly series. Walk-forward splits train on the past
+#only, and purged splits drop 12 months around each held-out block. The stepwise selection is rerun inside
+#every training set and scored there by its own walk-forward splits (in-sample R² would always keep every
+#feature), so the out-of-sample R² includes choosing the features
+lagged_y = lag_df["MPSTANCE"]
+walk_forward_ols = cross_validate_ols(lagged_y, lagged_X, walk_forward_splits(len(lagged_y), n_splits=5))
+purged_ols = cross_validate_ols(lagged_y, lagged_X, purged_splits(len(lagged_y), n_splits=5, purge=12, embargo=12))
+walk_forward_stepwise = cross_validate_stepwise(lagged_y, lagged_X, walk_forward_splits(len(lagged_y), n_splits=5),
+                                                inner_cv=partial(walk_forward_splits, n_splits=3))
+
+print(f"Walk-forward OLS out-of-sample R-squared: {walk_forward_ols.oos_r2:.3f}")
+print(f"Purged K-fold OLS out-of-sample R-squared: {purged_ols.oos_r2:.3f}")
+print(f"Walk-forward stepwise out-of-sample R-squared: {walk_forward_stepwise.oos_r2:.3f}")
+walk_forward_stepwise.folds
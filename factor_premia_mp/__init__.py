@@ -0,0 +1 @@
+"""Monetary policy stance and factor premia: reusable pieces of the analysis."""
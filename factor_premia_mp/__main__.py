@@ -0,0 +1,5 @@
+import sys
+
+from factor_premia_mp.cli import main
+
+sys.exit(main())
@@ -0,0 +1,120 @@
+"""Command line entry point: run one stage of the analysis on local files.
+
+    python -m factor_premia_mp stance --data-dir . --output-dir results
+
+Every stage runs the stages it depends on first (cheap once the input snapshots
+exist) and writes its results as CSV (or PNG for `plot`) to the output directory.
+The `stance` stage also writes `monthly_full_df` as a memory-mapped panel store
+(see `factor_premia_mp.panel_store`) for analyses that run in other processes.
+"""
+
+import argparse
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
+from factor_premia_mp import instrument, pipeline
+from factor_premia_mp.panel_store import write_panel
+from factor_premia_mp.stance import STANCE_START
+
+STAGES = ['data', 'stance', 'regression', 'lags', 'plot']
+
+
+def _inputs(args):
+    return pipeline.load_inputs(args.data_dir, args.cache_dir, args.refresh)
+
+
+def _panel(args):
+    #Built once per invocation and shared by the stages that follow
+    if getattr(args, 'panel', None) is None:
+        args.panel = pipeline.build_panel(_inputs(args), args.start)
+    return args.panel
+
+
+def run_data(args):
+    for kind, frame in _inputs(args).items():
+        print(f'{kind}: {frame.shape[0]} rows, {frame.shape[1]} columns')
+
+
+def run_stance(args):
+    mp_stance, monthly_full_df = _panel(args)
+    mp_stance.to_csv(args.output_dir / 'mp_stance.csv', index=False)
+    monthly_full_df.to_csv(args.output_dir / 'monthly_full_df.csv')
+    write_panel(monthly_full_df, args.output_dir / 'monthly_full_df.panel', args.store_dtype)
+    print(f'monthly_full_df: {monthly_full_df.shape[0]} months, {monthly_full_df.shape[1]} columns')
+
+
+def run_regression(args):
+    _, monthly_full_df = _panel(args)
+    windows = tuple(None if window == 'expanding' else int(window) for window in args.windows)
+    result = pipeline.regression(monthly_full_df, windows=windows)
+    result.coefficients.to_csv(args.output_dir / 'regression_coefficients.csv')
+    result.fit.to_csv(args.output_dir / 'regression_fit.csv')
+    print(result.fit.groupby(level='window').tail(1).to_string())
+
+
+def run_lags(args):
+    _, monthly_full_df = _panel(args)
+    best_lags = pipeline.lag_search(monthly_full_df, max_lag=args.max_lag)
+    best_lags.to_csv(args.output_dir / 'best_lags.csv', index=False)
+    print(best_lags.to_string(index=False))
+
+
+def run_plot(args):
+    import matplotlib
+    matplotlib.use('Agg')  #No display needed for batch jobs
+    from factor_premia_mp.plotting import plot_mp_stance
+
+    mp_stance, _ = _panel(args)
+    path = args.output_dir / 'mp_stance.png'
+    plot_mp_stance(mp_stance).savefig(path, dpi=150)
+    print(f'Wrote {path}')
+
+
+RUNNERS = {
+    'data': run_data,
+    'stance': run_stance,
+    'regression': run_regression,
+    'lags': run_lags,
+    'plot': run_plot,
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='factor_premia_mp', description=__doc__.splitlines()[0])
+    parser.add_argument('stages', nargs='+', choices=STAGES + ['all'], help='stages to run, in order')
+    parser.add_argument('--data-dir', type=Path, default=Path('.'), help='directory with the input workbooks')
+    parser.add_argument('--output-dir', type=Path, default=Path('results'), help='where results are written')
+    parser.add_argument('--cache-dir', type=Path, default=None, help='snapshot cache (default: next to the inputs)')
+    parser.add_argument('--refresh', action='store_true', help='re-parse the workbooks even if snapshots are current')
+    parser.add_argument('--start', default=STANCE_START, help='first date of the stance series')
+    parser.add_argument('--windows', nargs='+', default=['60', '120', 'expanding'],
+                        help='regression windows in months, or "expanding"')
+    parser.add_argument('--max-lag', type=int, default=12, help='largest lag of the Granger search')
+    parser.add_argument('--store-dtype', choices=['float64', 'float32'], default='float64',
+                        help='value type of the monthly_full_df panel store')
+    parser.add_argument('--report', type=Path, help='write a run report of every stage (.json or .html)')
+    parser.add_argument('--profile', nargs='+', default=(), metavar='STAGE',
+                        help='run these instrumented stages (e.g. stepwise, lag_search) under cProfile')
+    parser.add_argument('--sample', nargs='+', default=(), metavar='STAGE',
+                        help='sample the call stack of these instrumented stages')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    stages = STAGES if 'all' in args.stages else args.stages
+    recording = nullcontext()
+    if args.report or args.profile or args.sample:
+        recording = instrument.recording(args.report, profile=args.profile, sample=args.sample,
+                                         profile_dir=args.output_dir / 'profiles')
+    with recording:
+        for stage in stages:
+            RUNNERS[stage](args)
+            args.refresh = False  #Snapshots were rebuilt by the first stage
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""Loaders for the Excel inputs with a cached columnar snapshot.
+
+Each workbook is parsed and cleaned once, then written as an uncompressed Arrow
+IPC (Feather v2) file next to a small JSON record of the source's size, mtime
+and SHA-256. Later loads memory-map the snapshot and only re-parse the workbook
+when the source has actually changed. Float columns are stored with NaN as a
+value rather than as Arrow nulls, so on load they (and the date column) are
+views of the mapped file instead of copies.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+
+from factor_premia_mp.instrument import annotate, count, stage
+from factor_premia_mp.workbook import read_factor_premia_streaming
+
+CACHE_DIR_NAME = '.factor_premia_cache'
+SNAPSHOT_VERSION = 2  #Bump whenever a reader or the snapshot layout changes, so old snapshots are re-parsed
+
+
+@stage('read_excel')
+def _read_excel(path):
+    return pd.read_excel(path)
+
+
+@stage('clean')
+def read_fedfunds(path):
+    """Monthly federal funds rate: observation_date, FEDFUNDS."""
+    ffr = _read_excel(path)
+    ffr['observation_date'] = pd.to_datetime(ffr['observation_date'])
+    ffr['FEDFUNDS'] = ffr['FEDFUNDS'].astype(float)
+    return ffr
+
+
+@stage('clean')
+def read_rstar(path):
+    """Quarterly Laubach-Williams r-star: Date, RSTAR."""
+    rff = _read_excel(path)
+    rff = rff.rename(columns={'rstar': 'RSTAR'})  #Match format and style of column title to other dataframes
+    rff['Date'] = pd.to_datetime(rff['Date'])
+    rff['RSTAR'] = rff['RSTAR'].astype(float)
+    return rff
+
+
+@stage('clean')
+def read_spf(path):
+    """Quarterly SPF 10-year inflation expectations: YEAR, QUARTER, INFCPI10YR."""
+    spf = _read_excel(path)
+    return spf.astype({'YEAR': 'int64', 'QUARTER': 'int64', 'INFCPI10YR': float})
+
+
+@stage('clean')
+def read_factor_premia(path, header_row=17):
+    """Century of Factor Premia: Date plus one float column per factor."""
+    factor_premia = _read_excel(path)
+
+    #Row 17 holds the column headers; the data starts on the next row
+    columns = list(factor_premia.iloc[header_row])
+    clean_factor_premia = factor_premia.iloc[header_row + 1:].copy()
+    columns[0] = 'Date'
+    clean_factor_premia.columns = columns
+
+    clean_factor_premia['Date'] = pd.to_datetime(clean_factor_premia['Date'])
+    clean_factor_premia[columns[1:]] = clean_factor_premia[columns[1:]].astype(float)
+    return clean_factor_premia.reset_index(drop=True)
+
+
+READERS = {
+    'fedfunds': read_fedfunds,
+    'rstar': read_rstar,
+    'spf': read_spf,
+    'factor_premia': read_factor_premia_streaming,  #Same frame as read_factor_premia, without loading the sheet
+}
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for chunk in iter(lambda: source.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def snapshot_paths(path, kind, cache_dir=None):
+    """Snapshot and metadata file used for `path` read as `kind`."""
+    path = Path(path)
+    cache_dir = Path(cache_dir) if cache_dir is not None else path.parent / CACHE_DIR_NAME
+    stem = f'{path.name}.{kind}'
+    return cache_dir / f'{stem}.arrow', cache_dir / f'{stem}.json'
+
+
+def _write_snapshot(frame, snapshot, meta, source_meta):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    snapshot.parent.mkdir(parents=True, exist_ok=True)
+    tmp = snapshot.with_suffix('.arrow.tmp')
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for i, name in enumerate(table.column_names):
+        if pd.api.types.is_float_dtype(frame[name].dtype):
+            #from_pandas turns NaN into nulls, and columns with nulls cannot be read back without a copy
+            table = table.set_column(i, table.field(i), pa.array(frame[name].to_numpy(), from_pandas=False))
+    feather.write_feather(table, tmp, compression='uncompressed')
+    os.replace(tmp, snapshot)
+    meta.write_text(json.dumps(source_meta))
+
+
+def _read_snapshot(snapshot):
+    import pyarrow as pa
+
+    with pa.memory_map(str(snapshot)) as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True)  #One block per column: null-free columns stay views of the map
+
+
+@stage('load')
+def load(path, kind, cache_dir=None, refresh=False):
+    """Cleaned frame for the workbook at `path`, served from the snapshot when it is current.
+
+    `kind` is one of the keys of `READERS`. The snapshot is reused when the source's
+    size and mtime are unchanged, or when they changed but its SHA-256 did not.
+    """
+    reader = READERS[kind]
+    path = Path(path)
+    snapshot, meta = snapshot_paths(path, kind, cache_dir)
+    annotate(kind=kind, path=str(path))
+
+    stat = path.stat()
+    source_meta = {'version': SNAPSHOT_VERSION, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    cached_meta = None
+    if not refresh and snapshot.exists() and meta.exists():
+        cached_meta = json.loads(meta.read_text())
+
+    if cached_meta is not None and cached_meta.get('version') == SNAPSHOT_VERSION:
+        if all(cached_meta.get(key) == source_meta[key] for key in ('size', 'mtime_ns')):
+            count('snapshot_hit')
+            return _read_snapshot(snapshot)
+
+        #Touched but possibly not modified: compare contents before re-parsing
+        source_meta['sha256'] = _file_digest(path)
+        if cached_meta.get('sha256') == source_meta['sha256']:
+            meta.write_text(json.dumps(source_meta))
+            count('snapshot_hit')
+            return _read_snapshot(snapshot)
+
+    count('snapshot_miss')
+    frame = reader(path)
+    source_meta.setdefault('sha256', _file_digest(path))
+    _write_snapshot(frame, snapshot, meta, source_meta)
+    return frame
+
+
+def load_fedfunds(path, cache_dir=None):
+    return load(path, 'fedfunds', cache_dir)
+
+
+def load_rstar(path, cache_dir=None):
+    return load(path, 'rstar', cache_dir)
+
+
+def load_spf(path, cache_dir=None):
+    return load(path, 'spf', cache_dir)
+
+
+def load_factor_premia(path, cache_dir=None):
+    return load(path, 'factor_premia', cache_dir)
@@ -0,0 +1,128 @@
+"""Lagged design matrices as views over one buffer.
+
+`LaggedDesign` copies the source columns once into a column-major buffer. Each
+lagged column "<column>_lag<lag>" is then a contiguous slice of that buffer,
+already trimmed of the warm-up rows, so trying another set of lags costs no
+copies. The design is materialized only when a consumer needs a 2-D array
+(`np.asarray`, `to_frame`), and its cross-products can be formed from the views.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _lag_pairs(lags):
+    """[(column, lag), ...] from a {column: lag or [lags]} mapping, pairs, or a `lag_results` frame."""
+    if isinstance(lags, pd.DataFrame):
+        return [(column, int(lag)) for column, lag in lags.iloc[:, :2].itertuples(index=False)]
+    if isinstance(lags, dict):
+        pairs = []
+        for column, column_lags in lags.items():
+            for lag in np.atleast_1d(column_lags):
+                pairs.append((column, int(lag)))
+        return pairs
+    return [(column, int(lag)) for column, lag in lags]
+
+
+class LaggedDesign:
+    """Shifted columns of `data_frame` trimmed to the rows where every lag is available.
+
+    `lags` is a `lag_results` frame (Column, Best Lag), a {column: lag or [lags]} mapping,
+    or (column, lag) pairs. `y_variable`, if given, is exposed as `y` on the same rows.
+    `max_lag` (default the largest lag) sets the rows dropped at the start and must be at
+    least every lag. The object has `columns`, `index` and `shape` and converts with
+    `np.asarray`, so it can be passed to `StepwiseSelector` or `collinearity_diagnostics`;
+    `sm.OLS` only sees the array, so pass it `to_frame()` to keep the column names.
+    """
+
+    def __init__(self, data_frame, lags, y_variable=None, max_lag=None):
+        pairs = _lag_pairs(lags)
+        sources = list(dict.fromkeys([column for column, _ in pairs] + ([y_variable] if y_variable else [])))
+        self._buffer = np.asfortranarray(data_frame[sources].to_numpy(dtype=float))
+        self._source_index = data_frame.index
+        self._position = {column: i for i, column in enumerate(sources)}
+        self.y_variable = y_variable
+        self._set_lags(pairs, max_lag)
+
+    def _set_lags(self, pairs, max_lag):
+        largest = max(lag for _, lag in pairs)
+        if max_lag is not None and max_lag < largest:
+            raise ValueError(f'max_lag={max_lag} is smaller than the largest requested lag, {largest}.')
+        if any(lag < 0 for _, lag in pairs):
+            raise ValueError('Lags must be non-negative.')
+        missing = [column for column, _ in pairs if column not in self._position]
+        if missing:
+            raise KeyError(f'Columns not among the sources of the design: {missing}')
+        self.lags = pairs
+        self.max_lag = largest if max_lag is None else max_lag
+        self.columns = [f'{column}_lag{lag}' for column, lag in pairs]
+        self.index = self._source_index[self.max_lag:]
+
+    def with_lags(self, lags, max_lag=None):
+        """Another design over the same buffer (the columns must be among the sources)."""
+        design = object.__new__(LaggedDesign)
+        design.__dict__.update(self.__dict__)
+        design._set_lags(_lag_pairs(lags), max_lag)
+        return design
+
+    @property
+    def shape(self):
+        return (len(self.index), len(self.columns))
+
+    def __len__(self):
+        return len(self.index)
+
+    def series_view(self, column, lag=0):
+        """View of `column` shifted by `lag`, trimmed to the design rows."""
+        n_rows = self._buffer.shape[0]
+        return self._buffer[self.max_lag - lag:n_rows - lag, self._position[column]]
+
+    def column(self, position):
+        """View of the lagged column at `position` (or with that name)."""
+        if not isinstance(position, (int, np.integer)):
+            position = self.columns.index(position)
+        column, lag = self.lags[position]
+        return self.series_view(column, lag)
+
+    def _check_y(self):
+        if not self.y_variable:
+            raise ValueError('The design has no y_variable; pass one to LaggedDesign.')
+
+    @property
+    def y(self):
+        self._check_y()
+        return pd.Series(self.series_view(self.y_variable), index=self.index, name=self.y_variable)
+
+    def __array__(self, dtype=None, copy=None):
+        values = np.empty(self.shape, dtype=dtype or float, order='F')
+        for i in range(len(self.columns)):
+            values[:, i] = self.column(i)
+        return values
+
+    def to_frame(self, include_y=False):
+        """DataFrame of the design (one copy), with `y_variable` first if `include_y`."""
+        if include_y:
+            self._check_y()
+        frame = pd.DataFrame(np.asarray(self), index=self.index, columns=self.columns)
+        if include_y:
+            frame.insert(0, self.y_variable, self.series_view(self.y_variable))
+        return frame
+
+    def cross_products(self, add_constant=False):
+        """(X'X, X'y) from the column views, without materializing X.
+
+        X'y is None when there is no `y_variable`.
+        """
+        views = [self.column(i) for i in range(len(self.columns))]
+        if add_constant:
+            views.insert(0, np.ones(len(self)))
+        k = len(views)
+        xx = np.empty((k, k))
+        for i in range(k):
+            for j in range(i, k):
+                xx[i, j] = xx[j, i] = views[i] @ views[j]
+        xy = None
+        if self.y_variable:
+            y = self.series_view(self.y_variable)
+            xy = np.array([view @ y for view in views])
+        return xx, xy
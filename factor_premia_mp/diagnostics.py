@@ -0,0 +1,138 @@
+"""Collinearity diagnostics from one eigen-decomposition.
+
+`variance_inflation_factor(X, i)` fits an auxiliary OLS for every column. The
+same numbers are the diagonal of the inverse of the scaled cross-product matrix
+(the correlation matrix when the columns are centered), which the eigen-
+decomposition gives for every column at once along with the condition number.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from factor_premia_mp.instrument import stage
+
+_EIGEN_TOL = 1e-12
+
+CollinearityDiagnostics = namedtuple(
+    'CollinearityDiagnostics', ['vif', 'eigenvalues', 'eigenvectors', 'condition_number'])
+
+
+def _constant_columns(X):
+    return (np.ptp(X, axis=0) == 0) & (X[0] != 0) if len(X) else np.zeros(X.shape[1], bool)
+
+
+def _scaled_cross_products(X, centered, constant):
+    if centered:
+        #Constant columns are left as they are, like `standardize=True` in statsmodels
+        X = np.where(constant, X, X - X.mean(axis=0))
+    return _scale(X.T @ X)
+
+
+def _scale(gram):
+    norms = np.sqrt(np.diagonal(gram, axis1=-2, axis2=-1))
+    return gram / (norms[..., :, None] * norms[..., None, :])
+
+
+def _with_constant(vif, values, centered, constant):
+    """Rescale uncentered VIFs to centered R² for columns whose regressors include a constant.
+
+    This is what statsmodels' OLS does when it detects a constant among the regressors.
+    """
+    if centered or not constant.any():
+        return vif
+    others_constant = constant.sum() - constant > 0
+    uncentered = np.einsum('...ti,...ti->...i', values, values)
+    deviations = values - values.mean(axis=-2, keepdims=True)
+    centered_ss = np.einsum('...ti,...ti->...i', deviations, deviations)
+    return np.where(others_constant, vif * centered_ss / uncentered, vif)
+
+
+def _vif_from_eigen(eigenvalues, eigenvectors):
+    """diag(V diag(1/λ) V'), with inf for columns that load on a (numerically) zero eigenvalue."""
+    largest = eigenvalues[..., -1:]
+    singular = eigenvalues <= _EIGEN_TOL * largest
+    inverse = np.where(singular, 0.0, 1.0 / np.where(singular, 1.0, eigenvalues))
+    loadings = eigenvectors ** 2
+    vif = np.einsum('...ik,...k->...i', loadings, inverse)
+    on_null = np.einsum('...ik,...k->...i', loadings, singular.astype(float)) > _EIGEN_TOL
+    return np.where(on_null, np.inf, vif)
+
+
+@stage('vif')
+def collinearity_diagnostics(X, centered=False):
+    """VIF of every column, eigenvalues, eigenvectors and condition number of `X`.
+
+    With `centered=False` the VIFs match `variance_inflation_factor(X.values, i)`
+    without standardization, which regresses each column on the others as given;
+    `centered=True` uses the correlation matrix, like `standardize=True`.
+    The condition number is sqrt(λ_max / λ_min) of the scaled cross-product matrix.
+    """
+    columns = X.columns if hasattr(X, 'columns') else pd.RangeIndex(np.shape(X)[1])
+    values = np.asarray(X, dtype=float)
+
+    constant = _constant_columns(values)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(_scaled_cross_products(values, centered, constant))
+    vif = _with_constant(_vif_from_eigen(eigenvalues, eigenvectors), values, centered, constant)
+    condition_number = np.sqrt(eigenvalues[-1] / eigenvalues[0]) if eigenvalues[0] > 0 else np.inf
+
+    vif_scores = pd.DataFrame({'VIF Factor': vif, 'Feature': columns}).set_index('Feature')
+    eigen_frame = pd.DataFrame({
+        'Eigenvalue': eigenvalues[::-1],
+        'Condition Index': np.sqrt(eigenvalues[-1] / np.maximum(eigenvalues[::-1], np.finfo(float).tiny)),
+    })
+    eigenvectors = pd.DataFrame(eigenvectors[:, ::-1], index=columns)
+    return CollinearityDiagnostics(vif_scores, eigen_frame, eigenvectors, condition_number)
+
+
+def vif_scores(X, centered=False):
+    """The `vif_scores` frame (index "Feature", column "VIF Factor") in one linear-algebra pass."""
+    return collinearity_diagnostics(X, centered).vif
+
+
+def rolling_vif(X, window, centered=False):
+    """VIF of every column over each trailing window of `window` rows.
+
+    X'X and the column sums move with the window: the entering row's outer product is
+    added and the leaving row's subtracted, and both are recomputed from the rows every
+    `window` steps so rounding does not accumulate. Constant columns are detected within
+    each window. One k x k matrix is decomposed at a time; the result is indexed by the
+    last row of each window.
+    """
+    index = X.index if hasattr(X, 'index') else pd.RangeIndex(np.shape(X)[0])
+    columns = X.columns if hasattr(X, 'columns') else pd.RangeIndex(np.shape(X)[1])
+    values = np.asarray(X, dtype=float)
+    n_windows = len(values) - window + 1
+    windows = sliding_window_view(values, window, axis=0)  #(n_windows, k, window), a view
+    constant = (np.ptp(windows, axis=2) == 0) & (values[:max(n_windows, 0)] != 0)
+
+    vif = np.empty((max(n_windows, 0), values.shape[1]))
+    for t in range(n_windows):
+        if t % window == 0:
+            rows = values[t:t + window]
+            gram, sums = rows.T @ rows, rows.sum(axis=0)
+        else:
+            entering, leaving = values[t + window - 1], values[t - 1]
+            gram += np.outer(entering, entering) - np.outer(leaving, leaving)
+            sums += entering - leaving
+
+        is_constant = constant[t]
+        window_gram = gram
+        if centered:
+            #Constant columns are left as they are, like `standardize=True` in statsmodels
+            means = np.where(is_constant, 0.0, sums / window)
+            window_gram = (gram - np.outer(means, sums) - np.outer(sums, means)
+                           + window * np.outer(means, means))
+
+        eigenvalues, eigenvectors = np.linalg.eigh(_scale(window_gram))
+        vif[t] = _vif_from_eigen(eigenvalues, eigenvectors)
+        if not centered and is_constant.any():
+            others_constant = is_constant.sum() - is_constant > 0
+            squares = np.diagonal(gram)
+            centered_ss = np.where(is_constant, 0.0, squares - sums ** 2 / window)
+            with np.errstate(invalid='ignore'):
+                vif[t] = np.where(others_constant, vif[t] * centered_ss / squares, vif[t])
+    return pd.DataFrame(vif, index=index[window - 1:], columns=columns)
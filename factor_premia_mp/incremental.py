@@ -0,0 +1,242 @@
+"""Incremental monthly updates of the persisted panel and its model statistics.
+
+`MonthlyPanel` keeps `monthly_full_df` in append-only binary files together with
+everything a new month needs: the forward-fill state of RSTAR and INFCPI10YR, the
+last `max_lag` rows, the R factor of the OLS rows [1, x, y] (appending a row is a
+Householder update, and the solve never forms X'X) and, for the Granger lag
+search, the cross-products of [own lags, MPSTANCE lags, const, x_t] per factor
+column. Appending a month updates all of them in place, so the refresh costs the
+same whatever the length of the history.
+
+The statistics and the state (row count, forward-fill values, last date) are
+saved together in one file replaced atomically; bytes of rows appended to the
+data files but not committed there are dropped on the next load.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from factor_premia_mp.regression import solve_from_r
+
+STATS_FILE = 'stats.npz'
+VALUES_FILE = 'values.f8'
+DATES_FILE = 'dates.i8'
+
+
+def _save_stats(path, panel_stats, state):
+    with open(path, 'wb') as stats_file:  #A file object keeps np.savez from adding ".npz"
+        np.savez(stats_file, state=np.array(json.dumps(state)), **panel_stats)
+
+
+def _atomic_write(path, write):
+    tmp = path.with_name(path.name + '.tmp')
+    write(tmp)
+    os.replace(tmp, path)
+
+
+class MonthlyPanel:
+    """Persisted MPSTANCE/factor panel that grows one month at a time.
+
+    Column 0 is `y_variable` (MPSTANCE); the OLS uses a constant plus `x_columns`, and
+    the lag statistics cover every lag up to `max_lag` for each of `x_columns` in the
+    direction `find_best_lags` tests.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        with np.load(self.directory / STATS_FILE) as saved:
+            if 'state' not in saved.files or 'ols_r' not in saved.files:
+                raise ValueError(f'{self.directory} was written by an older version; recreate it with create().')
+            state = json.loads(str(saved['state']))
+            self._stats = {name: saved[name].copy() for name in saved.files if name != 'state'}
+        if int(self._stats['n_rows']) != state['n_rows']:
+            raise ValueError(f"{self.directory}: statistics cover {int(self._stats['n_rows'])} rows, "
+                             f"the state {state['n_rows']}.")
+        self.columns = state['columns']
+        self.x_columns = state['x_columns']
+        self.max_lag = state['max_lag']
+        self.n_rows = state['n_rows']
+        self.rstar = state['rstar']
+        self.infcpi10yr = state['infcpi10yr']
+        self.last_date = state['last_date']
+        self._x_position = [self.columns.index(column) for column in self.x_columns]
+
+        #Drop any bytes of a row that was written but never committed to the state
+        for name, width in ((VALUES_FILE, len(self.columns)), (DATES_FILE, 1)):
+            path = self.directory / name
+            if path.stat().st_size > self.n_rows * width * 8:
+                os.truncate(path, self.n_rows * width * 8)
+
+    @classmethod
+    def create(cls, directory, monthly_full_df, rstar, infcpi10yr, x_columns=None,
+               y_variable='MPSTANCE', max_lag=12):
+        """Persist `monthly_full_df` and compute every statistic once from its history.
+
+        `rstar` and `infcpi10yr` are the latest values of the components, carried forward
+        until a new observation arrives.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        columns = [y_variable] + [column for column in monthly_full_df.columns if column != y_variable]
+        x_columns = columns[1:] if x_columns is None else list(x_columns)
+
+        values = monthly_full_df[columns].to_numpy(dtype=float)
+        dates = np.asarray(monthly_full_df.index, dtype='datetime64[D]').astype('int64')
+        values.tofile(directory / VALUES_FILE)
+        dates.tofile(directory / DATES_FILE)
+
+        if np.any(np.diff(dates) <= 0):
+            raise ValueError('The dates of monthly_full_df must be unique and increasing.')
+
+        panel_stats = _history_stats(values, [columns.index(column) for column in x_columns], max_lag)
+        state = {
+            'columns': columns, 'x_columns': x_columns, 'max_lag': max_lag, 'n_rows': len(values),
+            'rstar': float(rstar), 'infcpi10yr': float(infcpi10yr),
+            'last_date': int(dates[-1]) if len(dates) else None,
+        }
+        _atomic_write(directory / STATS_FILE, lambda path: _save_stats(path, panel_stats, state))
+        return cls(directory)
+
+    def append(self, date, fedfunds, factor_premia, rstar=None, infcpi10yr=None):
+        """Add one month: MPSTANCE from the components, then every statistic in place.
+
+        `factor_premia` maps each factor column to its value. `rstar` and `infcpi10yr`
+        are only given in months with a new observation; otherwise the last value is
+        carried forward, as the forward fill in the stance construction does. `date` must
+        be after the last date in the panel.
+        """
+        date_key = np.datetime64(pd.Timestamp(date).date(), 'D').astype('int64')
+        if self.last_date is not None and date_key <= self.last_date:
+            last = np.datetime64(self.last_date, 'D')
+            raise ValueError(f'{pd.Timestamp(date).date()} is not after the last date in the panel, {last}.')
+
+        if rstar is not None and not np.isnan(rstar):
+            self.rstar = float(rstar)
+        if infcpi10yr is not None and not np.isnan(infcpi10yr):
+            self.infcpi10yr = float(infcpi10yr)
+        stance = fedfunds - (self.rstar + self.infcpi10yr)
+
+        row = np.array([stance] + [float(factor_premia[column]) for column in self.columns[1:]])
+        with open(self.directory / VALUES_FILE, 'ab') as values_file:
+            row.tofile(values_file)
+        with open(self.directory / DATES_FILE, 'ab') as dates_file:
+            np.array([date_key], dtype='int64').tofile(dates_file)
+
+        _add_row(self._stats, row, self._x_position, self.max_lag)
+        self.n_rows += 1
+        self.last_date = int(date_key)
+        self._save()
+        return stance
+
+    def _save(self):
+        #One rename commits the statistics and the state together
+        state = {
+            'columns': self.columns, 'x_columns': self.x_columns, 'max_lag': self.max_lag,
+            'n_rows': self.n_rows, 'rstar': self.rstar, 'infcpi10yr': self.infcpi10yr,
+            'last_date': self.last_date,
+        }
+        _atomic_write(self.directory / STATS_FILE, lambda path: _save_stats(path, self._stats, state))
+
+    def to_frame(self):
+        """The full panel as a DataFrame indexed by "Date" (reads the whole history)."""
+        values = np.fromfile(self.directory / VALUES_FILE, count=self.n_rows * len(self.columns))
+        dates = np.fromfile(self.directory / DATES_FILE, dtype='int64', count=self.n_rows)
+        index = pd.DatetimeIndex(dates.astype('datetime64[D]'), name='Date')
+        return pd.DataFrame(values.reshape(self.n_rows, -1), index=index, columns=self.columns)
+
+    def ols(self):
+        """Coefficients and R² of `y_variable` on a constant and `x_columns`, as `sm.OLS` gives them."""
+        solution = solve_from_r(self._stats['ols_r'], len(self.x_columns) + 1)
+        coef = solution.coef[:, 0]
+        r_squared = 1 - solution.ssr[0] / self._stats['moments'][2]
+        params = pd.Series(coef, index=['const'] + self.x_columns)
+        return params, r_squared
+
+    def granger_pvalues(self):
+        """(max_lag, k) Granger F-test p-values, as `granger_f_pvalues` gives on the full panel."""
+        return _granger_from_cross_products(self._stats['lag_tail'], self._stats['lag_head'],
+                                            self.n_rows, self.max_lag)
+
+    def best_lags(self):
+        """The `lag_results` table (Column, Best Lag) for the current panel."""
+        best = np.argmin(self.granger_pvalues(), axis=0)
+        return pd.DataFrame({'Column': self.x_columns, 'Best Lag': best + 1})
+
+
+def _lag_vectors(recent, row, x_position, max_lag):
+    """z = [x_{t-1..t-max_lag}, y_{t-1..t-max_lag}, 1, x_t] for every x column, shape (k, 2 * max_lag + 2).
+
+    `recent` holds the previous `max_lag` rows, most recent last; missing history is 0.
+    """
+    own = recent[::-1][:, x_position].T  #(k, max_lag), lag 1 first
+    cause = np.broadcast_to(recent[::-1, 0], own.shape)
+    ones = np.ones((len(x_position), 1))
+    return np.concatenate([own, cause, ones, row[x_position][:, None]], axis=1)
+
+
+def _add_row(panel_stats, row, x_position, max_lag):
+    ols_row = np.concatenate([[1.0], row[x_position], row[:1]])
+    panel_stats['ols_r'] = np.linalg.qr(np.vstack([panel_stats['ols_r'], ols_row]), mode='r')
+
+    #Count, mean and centered sum of squares of y (Welford)
+    moments = panel_stats['moments']
+    moments[0] += 1
+    delta = row[0] - moments[1]
+    moments[1] += delta / moments[0]
+    moments[2] += delta * (row[0] - moments[1])
+
+    recent = panel_stats['recent']
+    t = int(panel_stats['n_rows'])
+    z = _lag_vectors(recent, row, x_position, max_lag)
+    outer = np.einsum('ki,kj->kij', z, z)
+    if t >= max_lag:
+        panel_stats['lag_tail'] += outer
+    else:
+        #Rows before max_lag only enter the tests whose lag is at most t
+        panel_stats['lag_head'][t] += outer
+
+    panel_stats['recent'] = np.vstack([recent[1:], row])
+    panel_stats['n_rows'] += 1
+
+
+def _history_stats(values, x_position, max_lag):
+    k = len(x_position)
+    width = 2 * max_lag + 2
+    panel_stats = {
+        'ols_r': np.zeros((0, k + 2)), 'moments': np.zeros(3),
+        'lag_tail': np.zeros((k, width, width)), 'lag_head': np.zeros((max_lag, k, width, width)),
+        'recent': np.zeros((max_lag, values.shape[1])), 'n_rows': np.zeros(()),
+    }
+    for row in values:
+        _add_row(panel_stats, row, x_position, max_lag)
+    return panel_stats
+
+
+def _granger_from_cross_products(lag_tail, lag_head, n_obs, max_lag):
+    k = lag_tail.shape[0]
+    p_values = np.empty((max_lag, k))
+    const, target = 2 * max_lag, 2 * max_lag + 1
+    for lag in range(1, max_lag + 1):
+        #Sample of lag L: rows t >= L, i.e. the tail plus head rows L..max_lag-1 (stored by row)
+        cross = lag_tail + lag_head[lag:].sum(axis=0)
+        own = list(range(lag))
+        cause = list(range(max_lag, max_lag + lag))
+        restricted = own + [const]
+        unrestricted = own + cause + [const]
+
+        def ssr(design):
+            block = cross[:, design][:, :, design]
+            rhs = cross[:, design, target]
+            coef = np.linalg.solve(block, rhs[..., None])[..., 0]
+            return cross[:, target, target] - np.einsum('kp,kp->k', coef, rhs)
+
+        ssr_restricted, ssr_unrestricted = ssr(restricted), ssr(unrestricted)
+        df_resid = n_obs - lag - (2 * lag + 1)
+        f_stat = (ssr_restricted - ssr_unrestricted) / lag / (ssr_unrestricted / df_resid)
+        p_values[lag - 1] = stats.f.sf(f_stat, lag, df_resid)
+    return p_values
@@ -0,0 +1,346 @@
+"""Stage-level instrumentation of the pipeline.
+
+The main functions of each stage (loading and cleaning the workbooks, the stance,
+the merge, OLS, stepwise selection, the lag search and VIF) are wrapped with
+`stage`. While no `Recorder` is active the wrapper only checks a list and calls
+through. Inside `recording()` every call records wall and CPU time, the resident
+set size before and after, how far the stage raised the process's peak RSS
+(`peak_rss_growth`; the peak itself is a lifetime high-water mark, reported as
+`process_peak_rss`), the shapes of its array inputs, and any counters the stage
+bumps (e.g. snapshot cache hits). Stages can also run under cProfile or a
+sampling profiler; a profiled stage inside another one is covered by the outer
+profile, as only one cProfile can be active at a time. The recorder writes a
+JSON or HTML report.
+
+Recording can be switched on without touching code through the environment:
+FACTOR_PREMIA_REPORT=<path.json|.html> records the whole process and writes the
+report at exit; FACTOR_PREMIA_PROFILE and FACTOR_PREMIA_SAMPLE name a stage to
+profile or sample. The CLI has the same options as flags.
+"""
+
+import atexit
+import cProfile
+import functools
+import html
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  #Windows
+    resource = None
+
+_active = []  #Stack of recorders; stages report to the innermost one
+_profiling = []  #The running cProfile, if any, across all recorders
+
+
+def _peak_rss():
+    """Process high-water resident set size in bytes (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def _shapes(args, kwargs):
+    shapes = {}
+    for position, value in enumerate(args):
+        if hasattr(value, 'shape'):
+            shapes[f'arg{position}'] = list(value.shape)
+    for name, value in kwargs.items():
+        if hasattr(value, 'shape'):
+            shapes[name] = list(value.shape)
+    return shapes
+
+
+class _Sampler:
+    """Samples the stack of one thread every `interval` seconds from a background thread."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.leaf = Counter()
+        self.inclusive = Counter()
+        self.samples = 0
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            leaf = True
+            while frame is not None:
+                code = frame.f_code
+                name = f'{code.co_name} ({code.co_filename}:{code.co_firstlineno})'
+                if leaf:
+                    self.leaf[name] += 1
+                    leaf = False
+                if name not in seen:
+                    self.inclusive[name] += 1
+                    seen.add(name)
+                frame = frame.f_back
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def summary(self, top=30):
+        return {
+            'interval': self.interval,
+            'samples': self.samples,
+            'self': self.leaf.most_common(top),
+            'inclusive': self.inclusive.most_common(top),
+        }
+
+
+class Recorder:
+    """Collects one record per stage call, plus profiles of the selected stages.
+
+    `profile` and `sample` are stage names (or collections of names) to run under
+    cProfile or the sampling profiler; `profile_dir`, if given, also receives the raw
+    cProfile output as "<stage>-<n>.prof" for snakeviz and friends.
+    """
+
+    def __init__(self, profile=(), sample=(), sample_interval=0.005, profile_dir=None):
+        self.profile = {profile} if isinstance(profile, str) else set(profile or ())
+        self.sample = {sample} if isinstance(sample, str) else set(sample or ())
+        self.sample_interval = sample_interval
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.records = []
+        self.profiles = []
+        self.started = time.time()
+        self._stack = []
+
+    def count(self, counter, value=1):
+        """Add to a counter of the innermost running stage."""
+        if self._stack:
+            counters = self._stack[-1]['counters']
+            counters[counter] = counters.get(counter, 0) + value
+
+    def annotate(self, **attributes):
+        """Attach attributes (e.g. the workbook path) to the innermost running stage."""
+        if self._stack:
+            self._stack[-1]['attributes'].update(attributes)
+
+    @contextmanager
+    def stage(self, name, shapes=None):
+        record = {
+            'stage': name,
+            'path': '/'.join([parent['stage'] for parent in self._stack] + [name]),
+            'depth': len(self._stack),
+            'shapes': shapes or {},
+            'attributes': {},
+            'counters': {},
+            'children_wall': 0.0,
+            'rss_start': _current_rss(),
+        }
+        peak_start = _peak_rss()
+        profiler = None
+        if name in self.profile:
+            if _profiling:
+                record['attributes']['profile'] = 'within an enclosing profiled stage'
+            else:
+                profiler = cProfile.Profile()
+                _profiling.append(profiler)
+        sampler = _Sampler(self.sample_interval) if name in self.sample else None
+        self._stack.append(record)
+
+        wall, cpu = time.perf_counter(), time.process_time()
+        if sampler:
+            sampler.start()
+        if profiler:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler:
+                profiler.disable()
+                _profiling.remove(profiler)
+            if sampler:
+                sampler.stop()
+            record['wall'] = time.perf_counter() - wall
+            record['cpu'] = time.process_time() - cpu
+            record['self_wall'] = record['wall'] - record.pop('children_wall')
+            record['rss_end'] = _current_rss()
+            record['process_peak_rss'] = _peak_rss()
+            record['peak_rss_growth'] = None if peak_start is None else record['process_peak_rss'] - peak_start
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1]['children_wall'] += record['wall']
+            self.records.append(record)
+            if profiler:
+                self._add_profile(record, profiler)
+            if sampler:
+                self.profiles.append({'stage': record['path'], 'kind': 'sample', **sampler.summary()})
+
+    def _add_profile(self, record, profiler, top=30):
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats('cumulative').print_stats(top)
+        entry = {'stage': record['path'], 'kind': 'cprofile', 'text': text.getvalue()}
+        if self.profile_dir is not None:
+            self.profile_dir.mkdir(parents=True, exist_ok=True)
+            path = self.profile_dir / f"{record['stage']}-{len(self.profiles)}.prof"
+            profiler.dump_stats(path)
+            entry['file'] = str(path)
+        self.profiles.append(entry)
+
+    def summary(self):
+        """Totals per stage path: calls, wall, self wall, CPU and the largest RSS and peak RSS growth."""
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record['path'], {
+                'stage': record['path'], 'calls': 0, 'wall': 0.0, 'self_wall': 0.0, 'cpu': 0.0,
+                'max_rss_growth': None, 'max_peak_rss_growth': None, 'counters': {},
+            })
+            total['calls'] += 1
+            for key in ('wall', 'self_wall', 'cpu'):
+                total[key] += record[key]
+            if record['rss_start'] is not None and record['rss_end'] is not None:
+                growth = record['rss_end'] - record['rss_start']
+                total['max_rss_growth'] = max(growth, total['max_rss_growth'] or growth)
+            if record['peak_rss_growth'] is not None:
+                total['max_peak_rss_growth'] = max(record['peak_rss_growth'], total['max_peak_rss_growth'] or 0)
+            for counter, value in record['counters'].items():
+                total['counters'][counter] = total['counters'].get(counter, 0) + value
+        return sorted(totals.values(), key=lambda total: -total['self_wall'])
+
+    def report(self):
+        return {
+            'started': self.started,
+            'elapsed': time.time() - self.started,
+            'argv': sys.argv,
+            'process_peak_rss': _peak_rss(),
+            'summary': self.summary(),
+            'stages': self.records,
+            'profiles': self.profiles,
+        }
+
+    def write_report(self, path):
+        """Write the report as JSON, or as a standalone HTML page if `path` ends in .html."""
+        path = Path(path)
+        report = self.report()
+        if path.suffix.lower() in ('.html', '.htm'):
+            path.write_text(_html_report(report))
+        else:
+            path.write_text(json.dumps(report, indent=1, default=str))
+
+
+def _html_table(rows, columns):
+    head = ''.join(f'<th>{html.escape(column)}</th>' for column in columns)
+    body = []
+    for row in rows:
+        cells = []
+        for column in columns:
+            value = row.get(column)
+            if isinstance(value, float):
+                value = f'{value:.4f}'
+            elif isinstance(value, dict):
+                value = ', '.join(f'{key}={item}' for key, item in value.items())
+            cells.append(f'<td>{html.escape("" if value is None else str(value))}</td>')
+        body.append('<tr>' + ''.join(cells) + '</tr>')
+    return f'<table><tr>{head}</tr>{"".join(body)}</table>'
+
+
+def _html_report(report):
+    sections = [
+        '<h1>factor_premia_mp run report</h1>',
+        f'<p>{html.escape(" ".join(report["argv"]))}: {report["elapsed"]:.2f} s, '
+        f'process peak RSS {report["process_peak_rss"]} bytes</p>',
+        '<h2>By stage</h2>',
+        _html_table(report['summary'], ['stage', 'calls', 'wall', 'self_wall', 'cpu', 'max_rss_growth',
+                                           'max_peak_rss_growth', 'counters']),
+        '<h2>Calls</h2>',
+        _html_table(report['stages'], ['path', 'wall', 'self_wall', 'cpu', 'rss_start', 'rss_end', 'peak_rss_growth',
+                                       'process_peak_rss', 'shapes', 'attributes', 'counters']),
+    ]
+    for profile in report['profiles']:
+        sections.append(f'<h2>{html.escape(profile["kind"])}: {html.escape(profile["stage"])}</h2>')
+        if profile['kind'] == 'cprofile':
+            sections.append(f'<pre>{html.escape(profile["text"])}</pre>')
+        else:
+            rows = [{'function': name, 'samples': count} for name, count in profile['inclusive']]
+            sections.append(f'<p>{profile["samples"]} samples every {profile["interval"]} s (inclusive)</p>')
+            sections.append(_html_table(rows, ['function', 'samples']))
+    style = ('<style>body{font-family:sans-serif}table{border-collapse:collapse}'
+             'td,th{border:1px solid #ccc;padding:2px 6px;font-size:12px;text-align:left}</style>')
+    return f'<!DOCTYPE html><html><head><meta charset="utf-8">{style}</head><body>{"".join(sections)}</body></html>'
+
+
+def stage(name):
+    """Decorator recording each call of the function as stage `name` when a recorder is active."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _active:
+                return function(*args, **kwargs)
+            with _active[-1].stage(name, _shapes(args, kwargs)):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(counter, value=1):
+    """Bump a counter of the running stage (no-op when not recording)."""
+    if _active:
+        _active[-1].count(counter, value)
+
+
+def annotate(**attributes):
+    """Attach attributes to the running stage (no-op when not recording)."""
+    if _active:
+        _active[-1].annotate(**attributes)
+
+
+@contextmanager
+def recording(report=None, **options):
+    """Record every stage run inside the block; writes `report` (JSON or HTML) on exit if given.
+
+    `options` are passed to `Recorder` (profile, sample, sample_interval, profile_dir).
+    """
+    recorder = Recorder(**options)
+    _active.append(recorder)
+    try:
+        yield recorder
+    finally:
+        _active.remove(recorder)
+        if report is not None:
+            recorder.write_report(report)
+
+
+def _from_environment():
+    report = os.environ.get('FACTOR_PREMIA_REPORT')
+    if not report:
+        return
+    recorder = Recorder(
+        profile=[name for name in os.environ.get('FACTOR_PREMIA_PROFILE', '').split(',') if name],
+        sample=[name for name in os.environ.get('FACTOR_PREMIA_SAMPLE', '').split(',') if name],
+        profile_dir=os.environ.get('FACTOR_PREMIA_PROFILE_DIR'),
+    )
+    _active.append(recorder)
+    atexit.register(recorder.write_report, report)
+
+
+_from_environment()
@@ -0,0 +1,244 @@
+"""Batched Granger lag search.
+
+`grangercausalitytests` refits both regressions for every lag and every column.
+Here the lagged design matrices are built once per lag as NumPy blocks, the
+restricted regressions of every column are solved together with a stacked QR
+decomposition, and the unrestricted fit only adds the QR of the extra lags
+orthogonalized against it.
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import stats
+
+from factor_premia_mp.instrument import stage
+from factor_premia_mp.shared import resolve_jobs, shared_pool, worker_array
+
+
+def lag_block(values, lag):
+    """Return lags 1..lag of each column as an array of shape (k, T - lag, lag)."""
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 1:
+        values = values[:, None]
+
+    windows = sliding_window_view(values, lag + 1, axis=0)  #(T - lag, k, lag + 1)
+    lags = windows[:, :, lag - 1::-1]  #Lag 1 first, lag `lag` last
+    return np.ascontiguousarray(lags.transpose(1, 0, 2))
+
+
+def _restricted_fit(own, target):
+    """Orthonormal basis of [own lags, const] and the residual of `target` on it.
+
+    `own` is (k, n, lag) and `target` (k, n); k can be 1 for a series shared by every test.
+    """
+    const = np.ones(own.shape[:2] + (1,))
+    q, _ = np.linalg.qr(np.concatenate([own, const], axis=2))
+    residual = target - (q @ (np.swapaxes(q, 1, 2) @ target[..., None]))[..., 0]
+    return q, residual
+
+
+def _added_ssr(q, residual, extra):
+    """Drop in SSR from adding the `extra` regressors to the restricted fit (q, residual).
+
+    The extra columns are orthogonalized against q, so only their own QR is needed.
+    Shapes broadcast over the leading axes, e.g. one shared fit with k sets of extra lags,
+    or (1, k) fits against (m, 1) sets of extra lags.
+    """
+    extra = extra - q @ (np.swapaxes(q, -1, -2) @ extra)
+    q_extra, _ = np.linalg.qr(extra)
+    projected = (np.swapaxes(q_extra, -1, -2) @ residual[..., None])[..., 0]
+    return np.einsum('...p,...p->...', projected, projected)
+
+
+def _f_pvalues(ssr_restricted, ssr_drop, n_obs, lag):
+    df_resid = n_obs - lag - (2 * lag + 1)
+    ssr_unrestricted = ssr_restricted - ssr_drop
+    f_stat = ssr_drop / lag / (ssr_unrestricted / df_resid)
+    return stats.f.sf(f_stat, lag, df_resid)
+
+
+def _as_columns(values):
+    values = np.asarray(values, dtype=float)
+    return values[:, None] if values.ndim == 1 else values
+
+
+def _check_length(n_obs, max_lag):
+    if n_obs <= 3 * max_lag + 1:
+        raise ValueError(f"Need more than {3 * max_lag + 1} observations for max_lag={max_lag}.")
+
+
+def granger_f_pvalues(target, cause, max_lag=12):
+    """F-test p-values that `cause` Granger-causes `target` for lags 1..max_lag.
+
+    `target` and `cause` are (T, k) arrays, or single (T,) series shared by every test;
+    a shared series has its lag block and restricted fit computed once. The result has
+    shape (max_lag, k) and matches
+    `grangercausalitytests(pd.DataFrame({'x': target, 'y': cause}))[lag][0]['params_ftest'][1]`.
+    """
+    target = _as_columns(target)
+    cause = _as_columns(cause)
+    n_obs = target.shape[0]
+    n_cols = max(target.shape[1], cause.shape[1])
+    _check_length(n_obs, max_lag)
+
+    p_values = np.empty((max_lag, n_cols))
+    for lag in range(1, max_lag + 1):
+        q, residual = _restricted_fit(lag_block(target, lag), target[lag:].T)
+        ssr_drop = _added_ssr(q, residual, lag_block(cause, lag))
+        ssr_restricted = np.einsum('kn,kn->k', residual, residual)
+        p_values[lag - 1] = _f_pvalues(ssr_restricted, ssr_drop, n_obs, lag)
+
+    return p_values
+
+
+def granger_f_pvalues_by_cause(target, causes, max_lag=12):
+    """`granger_f_pvalues` of every column of `target` (T, k) against each column of `causes` (T, m).
+
+    The restricted fits of the target columns on their own lags do not depend on the
+    cause, so each lag's fits are computed once and all m causes (e.g. stance definitions)
+    are added to them in one broadcast (m, k) batch. The result has shape (m, max_lag, k).
+    """
+    target = _as_columns(target)
+    causes = _as_columns(causes)
+    n_obs = target.shape[0]
+    _check_length(n_obs, max_lag)
+
+    p_values = np.empty((causes.shape[1], max_lag, target.shape[1]))
+    for lag in range(1, max_lag + 1):
+        q, residual = _restricted_fit(lag_block(target, lag), target[lag:].T)
+        ssr_restricted = np.einsum('kn,kn->k', residual, residual)
+        cause_lags = lag_block(causes, lag)[:, None]  #(m, 1, n, lag) against the (1, k) fits
+        ssr_drop = _added_ssr(q[None], residual[None], cause_lags)
+        p_values[:, lag - 1] = _f_pvalues(ssr_restricted, ssr_drop, n_obs, lag)
+
+    return p_values
+
+
+def bidirectional_granger_pvalues(factors, stance, max_lag=12):
+    """p-values for both directions between each factor column and one stance series.
+
+    Returns (stance_to_factor, factor_to_stance), each of shape (max_lag, k). For every
+    lag the stance lag block and the stance's own restricted fit are built once and
+    shared by all k factor tests in both directions.
+    """
+    factors = _as_columns(factors)
+    stance = _as_columns(stance)
+    n_obs = factors.shape[0]
+    _check_length(n_obs, max_lag)
+
+    stance_to_factor = np.empty((max_lag, factors.shape[1]))
+    factor_to_stance = np.empty((max_lag, factors.shape[1]))
+    for lag in range(1, max_lag + 1):
+        stance_lags = lag_block(stance, lag)  #(1, n, lag), shared
+        factor_lags = lag_block(factors, lag)  #(k, n, lag)
+
+        q, residual = _restricted_fit(factor_lags, factors[lag:].T)
+        ssr_restricted = np.einsum('kn,kn->k', residual, residual)
+        stance_to_factor[lag - 1] = _f_pvalues(ssr_restricted, _added_ssr(q, residual, stance_lags), n_obs, lag)
+
+        q, residual = _restricted_fit(stance_lags, stance[lag:].T)
+        ssr_restricted = residual[0] @ residual[0]
+        factor_to_stance[lag - 1] = _f_pvalues(ssr_restricted, _added_ssr(q, residual, factor_lags), n_obs, lag)
+
+    return stance_to_factor, factor_to_stance
+
+
+def _best(p_values):
+    #argmin keeps the first lag on ties, like the strict `<` in the original loop
+    best = np.argmin(p_values, axis=0)
+    return best + 1, p_values[best, np.arange(p_values.shape[1])]
+
+
+@stage('lag_search')
+def bidirectional_best_lags(x_columns, y_variable, data_frame, max_lag=12):
+    """Best lag and p-value in both directions between `y_variable` and each column.
+
+    "MP->Factor" is the direction `find_best_lags` tests (the y variable's lags added to
+    the column's own lags); "Factor->MP" adds the column's lags to a regression of the
+    y variable on its own lags.
+    """
+    x_columns = list(x_columns)
+    stance_to_factor, factor_to_stance = bidirectional_granger_pvalues(
+        data_frame[x_columns].values, data_frame[y_variable].values, max_lag)
+
+    forward_lag, forward_p = _best(stance_to_factor)
+    reverse_lag, reverse_p = _best(factor_to_stance)
+    return pd.DataFrame({
+        'Column': x_columns,
+        'MP->Factor Best Lag': forward_lag,
+        'MP->Factor P-Value': forward_p,
+        'Factor->MP Best Lag': reverse_lag,
+        'Factor->MP P-Value': reverse_p,
+    })
+
+
+def _granger_task(task):
+    target_index, start, stop, max_lag = task
+    target = worker_array('x')[:, start:stop]
+    cause = worker_array('y')[:, target_index]
+    return granger_f_pvalues(target, cause, max_lag)
+
+
+def parallel_granger_pvalues(target, causes, max_lag=12, n_jobs=None, chunk_size=None):
+    """`granger_f_pvalues` for every y target, spread over a process pool.
+
+    `target` is (T, k) and `causes` is (T, m), e.g. alternative MP-stance definitions.
+    Both are placed in shared memory once; each task covers one y target and a chunk
+    of columns. The result has shape (m, max_lag, k) in input order.
+    """
+    target = np.asarray(target, dtype=float)
+    causes = np.asarray(causes, dtype=float)
+    if causes.ndim == 1:
+        causes = causes[:, None]
+
+    n_cols = target.shape[1]
+    n_jobs = resolve_jobs(n_jobs)
+    if chunk_size is None:
+        chunk_size = max(1, -(-n_cols * causes.shape[1] // (4 * n_jobs)))  #About four tasks per worker
+
+    tasks = [(i, start, min(start + chunk_size, n_cols), max_lag)
+             for i in range(causes.shape[1]) for start in range(0, n_cols, chunk_size)]
+
+    p_values = np.empty((causes.shape[1], max_lag, n_cols))
+    with shared_pool(n_jobs, x=target, y=causes) as pool:
+        #map yields results in task order, so the merge does not depend on scheduling
+        for (i, start, stop, _), block in zip(tasks, pool.map(_granger_task, tasks)):
+            p_values[i, :, start:stop] = block
+
+    return p_values
+
+
+@stage('lag_search')
+def find_best_lags(x_columns, y_variable, data_frame, max_lag=12, n_jobs=1):
+    """Best Granger lag of each column, in the same layout as `lag_results`.
+
+    With `n_jobs` other than 1 the columns are scanned on a process pool.
+    """
+    x_columns = list(x_columns)
+    x_values = data_frame[x_columns].values
+    y_values = data_frame[y_variable].values
+    if n_jobs == 1:
+        p_values = granger_f_pvalues(x_values, y_values, max_lag)
+    else:
+        p_values = parallel_granger_pvalues(x_values, y_values, max_lag, n_jobs)[0]
+
+    best_lag, _ = _best(p_values)
+    return pd.DataFrame({'Column': x_columns, 'Best Lag': best_lag})
+
+
+@stage('lag_search')
+def scan_best_lags(x_columns, y_variables, data_frame, max_lag=12, n_jobs=None):
+    """Best Granger lag of each column for several y targets, one row per (target, column)."""
+    x_columns = list(x_columns)
+    y_variables = list(y_variables)
+    p_values = parallel_granger_pvalues(data_frame[x_columns].values, data_frame[y_variables].values,
+                                        max_lag, n_jobs)
+
+    best = np.argmin(p_values, axis=1)  #(m, k)
+    return pd.DataFrame({
+        'Target': np.repeat(y_variables, len(x_columns)),
+        'Column': np.tile(x_columns, len(y_variables)),
+        'Best Lag': best.ravel() + 1,
+        'P-Value': np.take_along_axis(p_values, best[:, None, :], axis=1).ravel(),
+    })
@@ -0,0 +1,275 @@
+"""Joint search over lag specifications of the factor premia.
+
+`find_best_lags` picks one lag per column on its own, by Granger p-value, and the
+joint OLS is fitted afterwards. `search_lag_specifications` scores whole
+specifications instead: any set of (column, lag) terms with at most
+`max_lags_per_column` lags of each column, by the AIC or BIC of the joint OLS or
+by its walk-forward out-of-sample MSE.
+
+Every specification is fitted on the same rows (t >= max_lag), so all scores come
+from the Gram matrix of [const, every candidate lag, y], formed once from a
+`LaggedDesign`. Two searches are available:
+
+- greedy: stepwise additions and removals. All candidate additions are scored at
+  once from the Schur complement of the current fit (a rank-one extension of the
+  normal equations), and all removals from its inverse Gram matrix.
+- branch_and_bound: exhaustive over each column's choice of lags, for AIC and
+  BIC. A model with every lag of the undecided columns has an SSR no larger than
+  any completion, and the penalty only counts the decided terms, so subtrees whose
+  bound is above the best specification so far are pruned. The Schur complements
+  that give these bounds are precomputed once per depth, so each node costs a
+  solve the size of its own specification. The greedy result is the first incumbent.
+"""
+
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.design import LaggedDesign
+from factor_premia_mp.validation import _fold_cross_products, walk_forward_splits
+
+LagSpecification = namedtuple('LagSpecification', ['lags', 'score', 'path', 'complete'])
+
+_TOL = 1e-10
+
+
+def information_criterion(ssr, n_obs, n_params, criterion='bic'):
+    """AIC or BIC of a Gaussian OLS fit, on the scale `sm.OLS(...).fit().aic` / `.bic` use."""
+    llf = -n_obs / 2 * (np.log(2 * np.pi) + np.log(ssr / n_obs) + 1)
+    penalty = 2 if criterion == 'aic' else np.log(n_obs)
+    return -2 * llf + penalty * n_params
+
+
+class _GramFit:
+    """OLS of y on the `active` terms (const first) from a Gram matrix of [const, candidates, y]."""
+
+    def __init__(self, gram, active):
+        self.gram = gram
+        self.y = gram.shape[0] - 1
+        self.active = list(active)
+        self.inv = np.linalg.inv(gram[np.ix_(self.active, self.active)])
+        self.coef = self.inv @ gram[self.active, self.y]
+        self.ssr = gram[self.y, self.y] - self.coef @ gram[self.active, self.y]
+
+    def add(self, candidates):
+        """SSR and coefficients (C, p + 1) after adding each candidate; SSR is NaN if it is collinear."""
+        cross = self.gram[np.ix_(self.active, candidates)]
+        projected = self.inv @ cross
+        norms = self.gram[candidates, candidates]
+        residual_norm = norms - np.einsum('pc,pc->c', cross, projected)
+        residual_y = self.gram[candidates, self.y] - projected.T @ self.gram[self.active, self.y]
+
+        collinear = residual_norm <= _TOL * np.maximum(norms, np.finfo(float).tiny)
+        gamma = np.where(collinear, 0.0, residual_y / np.where(collinear, 1.0, residual_norm))
+        ssr = np.where(collinear, np.nan, self.ssr - gamma * residual_y)
+        coef = np.column_stack([self.coef[None, :] - projected.T * gamma[:, None], gamma])
+        return ssr, coef
+
+    def drop(self):
+        """SSR and coefficients (p, p), zero at the dropped term, after dropping each active term."""
+        diagonal = np.diag(self.inv)
+        ssr = self.ssr + self.coef ** 2 / diagonal
+        coef = self.coef[None, :] - self.inv.T * (self.coef / diagonal)[:, None]
+        np.fill_diagonal(coef, 0.0)
+        return ssr, coef
+
+
+def _test_sse(gram, terms, coef):
+    """Test-set SSE of coefficient rows `coef` (R, p) on `terms` (R, p) from the test Gram matrix."""
+    y = gram.shape[0] - 1
+    xx = gram[terms[:, :, None], terms[:, None, :]]
+    xy = gram[terms, y]
+    return gram[y, y] - 2 * np.einsum('rp,rp->r', coef, xy) + np.einsum('rp,rpq,rq->r', coef, xx, coef)
+
+
+class _Scorer:
+    """Criterion of the current specification, of each addition and of each removal."""
+
+    def __init__(self, Z, criterion, splits):
+        self.criterion = criterion
+        self.n_obs = len(Z)
+        self.gram = Z.T @ Z
+        if criterion == 'cv':
+            self.folds = []
+            for train, test in splits:
+                train_gram, _ = _fold_cross_products(Z, Z[:, -1], self.gram, self.gram[:, -1], train)
+                self.folds.append((train_gram, Z[test].T @ Z[test]))
+            self.n_test = sum(len(test) for _, test in splits)
+
+    def _ic(self, ssr, n_params):
+        return information_criterion(ssr, self.n_obs, n_params, self.criterion)
+
+    def score(self, active):
+        if self.criterion != 'cv':
+            return float(self._ic(_GramFit(self.gram, active).ssr, len(active)))
+        total = 0.0
+        for train_gram, test_gram in self.folds:
+            fit = _GramFit(train_gram, active)
+            total += _test_sse(test_gram, np.array([fit.active]), fit.coef[None, :])[0]
+        return total / self.n_test
+
+    def add_scores(self, active, candidates):
+        if self.criterion != 'cv':
+            ssr, _ = _GramFit(self.gram, active).add(candidates)
+            return self._ic(ssr, len(active) + 1)
+        total = np.zeros(len(candidates))
+        terms = np.column_stack([np.tile(active, (len(candidates), 1)), candidates])
+        for train_gram, test_gram in self.folds:
+            ssr, coef = _GramFit(train_gram, active).add(candidates)
+            total += np.where(np.isnan(ssr), np.nan, _test_sse(test_gram, terms, coef))
+        return total / self.n_test
+
+    def drop_scores(self, active):
+        if self.criterion != 'cv':
+            ssr, _ = _GramFit(self.gram, active).drop()
+            return self._ic(ssr, len(active) - 1)
+        total = np.zeros(len(active))
+        terms = np.tile(active, (len(active), 1))
+        for train_gram, test_gram in self.folds:
+            _, coef = _GramFit(train_gram, active).drop()
+            total += _test_sse(test_gram, terms, coef)
+        return total / self.n_test
+
+
+def _greedy(scorer, owner, n_columns, max_lags_per_column):
+    active = [0]
+    counts = np.zeros(n_columns, dtype=int)
+    current = scorer.score(active)
+    path = [('start', None, current)]
+
+    for _ in range(4 * len(owner)):  #Guards against cycling on ties
+        candidates = np.array([term for term in range(1, len(owner))
+                               if term not in active and counts[owner[term]] < max_lags_per_column], dtype=int)
+        add = scorer.add_scores(active, candidates) if len(candidates) else np.array([])
+        drop = scorer.drop_scores(active)[1:] if len(active) > 1 else np.array([])  #Never the constant
+
+        best_add = np.nanargmin(add) if np.isfinite(add).any() else None
+        best_drop = int(np.argmin(drop)) if len(drop) else None
+        options = []
+        if best_add is not None:
+            options.append((add[best_add], 'add', int(candidates[best_add])))
+        if best_drop is not None:
+            options.append((drop[best_drop], 'drop', active[1 + best_drop]))
+        if not options:
+            break
+        score, action, term = min(options)
+        if not score < current - 1e-12:
+            break
+
+        if action == 'add':
+            active.append(term)
+            counts[owner[term]] += 1
+        else:
+            active.remove(term)
+            counts[owner[term]] -= 1
+        current = float(score)
+        path.append((action, term, current))
+    return active, current, path
+
+
+def _branch_and_bound(scorer, owner, n_columns, max_lags_per_column, incumbent, max_nodes):
+    gram, n_obs, criterion = scorer.gram, scorer.n_obs, scorer.criterion
+    y = gram.shape[0] - 1
+    terms_of = [[term for term in range(1, len(owner)) if owner[term] == column] for column in range(n_columns)]
+
+    #Decide the columns that reduce the SSR most on their own first, for early good incumbents
+    single = _GramFit(gram, [0]).add(np.arange(1, len(owner)))[0]
+    strength = [np.nanmin(single[np.array(terms) - 1]) for terms in terms_of]
+    order = list(np.argsort(strength))
+    ordered_terms = [term for column in order for term in terms_of[column]]
+    position = {term: i for i, term in enumerate(ordered_terms)}
+
+    #Schur complement of [terms of the decided columns, y] given const and every undecided term, per depth
+    complements = []
+    decided = 0
+    for depth in range(n_columns + 1):
+        kept = ordered_terms[:decided] + [y]
+        rest = [0] + ordered_terms[decided:]
+        cross = gram[np.ix_(kept, rest)]
+        complements.append(gram[np.ix_(kept, kept)] - cross @ np.linalg.pinv(gram[np.ix_(rest, rest)], hermitian=True) @ cross.T)
+        if depth < n_columns:
+            decided += len(terms_of[order[depth]])
+
+    def bound(chosen, depth):
+        complement = complements[depth]
+        if not chosen:
+            ssr = complement[-1, -1]
+        else:
+            index = [position[term] for term in chosen]
+            block = complement[np.ix_(index, index)]
+            rhs = complement[index, -1]
+            ssr = complement[-1, -1] - rhs @ np.linalg.pinv(block, hermitian=True) @ rhs
+        return information_criterion(max(ssr, np.finfo(float).tiny), n_obs, 1 + len(chosen), criterion)
+
+    best_active, best_score = incumbent
+    path = [('incumbent', None, best_score, 0)]
+    nodes = 0
+    stack = [([], 0)]
+    while stack:
+        chosen, depth = stack.pop()
+        nodes += 1
+        if nodes > max_nodes:
+            return best_active, best_score, path, False
+        if depth == n_columns:
+            score = bound(chosen, depth)  #Exact at the leaves: nothing is left undecided
+            if score < best_score - 1e-12:
+                best_active, best_score = [0] + chosen, score
+                path.append(('incumbent', None, best_score, nodes))
+            continue
+
+        terms = terms_of[order[depth]]
+        children = []
+        for size in range(max_lags_per_column + 1):
+            for option in combinations(terms, size):
+                child = chosen + list(option)
+                child_bound = bound(child, depth + 1)
+                if child_bound < best_score - 1e-12:
+                    children.append((child_bound, child))
+        #Depth first, most promising child on top of the stack
+        for _, child in sorted(children, key=lambda item: -item[0]):
+            stack.append((child, depth + 1))
+    return best_active, best_score, path, True
+
+
+def search_lag_specifications(data_frame, x_columns, y_variable='MPSTANCE', max_lag=12, criterion='bic',
+                              method='greedy', max_lags_per_column=1, splits=None, max_nodes=200000):
+    """Lag specification of `x_columns` that minimizes `criterion` for the joint OLS of `y_variable`.
+
+    `criterion` is 'aic', 'bic' or 'cv' (walk-forward test MSE over `splits`, by default
+    five walk-forward splits of the common sample). `method` is 'greedy' or
+    'branch_and_bound' (AIC/BIC only; stops after `max_nodes` nodes with `complete`
+    False). Returns `LagSpecification(lags, score, path, complete)`: `lags` has Column and
+    Lag rows and can be passed to `LaggedDesign`; `path` lists the search steps.
+    """
+    if criterion not in ('aic', 'bic', 'cv'):
+        raise ValueError(f"criterion must be 'aic', 'bic' or 'cv', not {criterion!r}.")
+    if method == 'branch_and_bound' and criterion == 'cv':
+        raise ValueError('branch_and_bound needs an information criterion; use method="greedy" for cv.')
+
+    x_columns = list(x_columns)
+    pairs = [(column, lag) for column in x_columns for lag in range(1, max_lag + 1)]
+    design = LaggedDesign(data_frame, pairs, y_variable=y_variable, max_lag=max_lag)
+    Z = np.column_stack([np.ones(len(design)), np.asarray(design), design.series_view(y_variable)])
+    owner = np.array([-1] + [i for i in range(len(x_columns)) for _ in range(max_lag)])  #Column of each term
+
+    if criterion == 'cv' and splits is None:
+        splits = walk_forward_splits(len(Z), n_splits=5)
+    scorer = _Scorer(Z, criterion, splits)
+
+    active, score, path = _greedy(scorer, owner, len(x_columns), max_lags_per_column)
+    complete = True
+    if method == 'branch_and_bound':
+        active, score, path, complete = _branch_and_bound(scorer, owner, len(x_columns), max_lags_per_column,
+                                                          (active, score), max_nodes)
+    elif method != 'greedy':
+        raise ValueError(f"method must be 'greedy' or 'branch_and_bound', not {method!r}.")
+
+    chosen = sorted(term for term in active if term)
+    lags = pd.DataFrame({'Column': [pairs[term - 1][0] for term in chosen],
+                         'Lag': [pairs[term - 1][1] for term in chosen]})
+    path = pd.DataFrame([(step[0], *(pairs[step[1] - 1] if step[1] else (None, None)), *step[2:])
+                         for step in path],
+                        columns=['action', 'Column', 'Lag', 'score'] + (['nodes'] if method == 'branch_and_bound' else []))
+    return LagSpecification(lags, float(score), path, complete)
@@ -0,0 +1,264 @@
+"""Disk-backed memoization of model fits keyed by the content of their inputs.
+
+`MemoCache.call(function, *args, **kwargs)` hashes the function (module, name and,
+for Python functions, its bytecode and constants) together with every argument:
+arrays, Series and DataFrames by their dtype, shape, labels and raw bytes, and
+estimator objects such as an unfitted `StepwiseSelector` by their parameters;
+a `functools.partial` by its function, arguments and keywords.
+The result is pickled under `<directory>/<function>/<key>.pkl`, so identical
+calls in later runs or other processes are read back instead of recomputed, and
+a changed input or parameter simply gives another key. The key also includes a
+fingerprint of the source files of the function's package (or of its module when
+it is not in a package), so editing a helper the function calls, not only the
+function itself, makes earlier results unreachable.
+
+Entries are evicted least recently used first (a hit refreshes the file's mtime)
+once the cache is above `max_bytes` or `max_entries`, and can be dropped
+explicitly per function or all at once.
+"""
+
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.data import CACHE_DIR_NAME
+from factor_premia_mp.instrument import count, stage
+
+DEFAULT_DIRECTORY = Path(CACHE_DIR_NAME) / 'memo'
+KEY_VERSION = 3
+
+
+def _update_array(digest, values):
+    values = np.asarray(values)
+    digest.update(f'{values.dtype.str}{values.shape}'.encode())
+    if values.dtype.hasobject:
+        digest.update(pickle.dumps(values.tolist(), protocol=4))
+    else:
+        digest.update(np.ascontiguousarray(values).view(np.uint8).data)
+
+
+def _update(digest, value):
+    """Feed a canonical encoding of `value` to `digest`."""
+    if value is None or isinstance(value, (bool, int, float, complex, str, bytes)):
+        digest.update(f'{type(value).__name__}:{value!r}'.encode())
+    elif isinstance(value, Path):
+        digest.update(f'Path:{value}'.encode())
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}[{len(value)}]'.encode())
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, dict):
+        digest.update(f'dict[{len(value)}]'.encode())
+        for key in sorted(value, key=repr):
+            _update(digest, key)
+            _update(digest, value[key])
+    elif isinstance(value, (set, frozenset)):
+        _update(digest, sorted(value, key=repr))
+    elif isinstance(value, np.ndarray) or np.isscalar(value):
+        _update_array(digest, value)
+    elif isinstance(value, pd.Index):
+        digest.update(f'Index:{value.name!r}'.encode())
+        _update_array(digest, value.to_numpy())
+    elif isinstance(value, pd.Series):
+        digest.update(f'Series:{value.name!r}'.encode())
+        _update(digest, value.index)
+        _update_array(digest, value.to_numpy())
+    elif isinstance(value, pd.DataFrame):
+        digest.update(b'DataFrame')
+        _update(digest, value.index)
+        _update(digest, list(value.columns))
+        for _, column in value.items():
+            _update_array(digest, column.to_numpy())
+    elif hasattr(value, '__array__'):
+        _update(digest, list(getattr(value, 'columns', [])))
+        _update_array(digest, np.asarray(value))
+    elif isinstance(value, functools.partial):
+        digest.update(b'partial')
+        _update(digest, value.func)
+        _update(digest, value.args)
+        _update(digest, value.keywords)
+    elif callable(value) and hasattr(value, '__qualname__'):
+        _update_function(digest, value)
+    elif callable(value):
+        #Callable objects: their state may not be in __dict__ (slots, C types), so pickle them
+        try:
+            digest.update(pickle.dumps(value, protocol=4))
+        except Exception as error:
+            raise TypeError(f'Cannot build a memo key from the callable {value!r}.') from error
+    elif hasattr(value, '__dict__'):
+        #Estimators and other plain objects: class plus public attributes
+        digest.update(f'{type(value).__module__}.{type(value).__qualname__}'.encode())
+        _update(digest, {name: item for name, item in vars(value).items() if not name.startswith('_')})
+    else:
+        digest.update(pickle.dumps(value, protocol=4))
+
+
+def _update_function(digest, function):
+    bound_to = getattr(function, '__self__', None)
+    function = getattr(function, '__func__', function)
+    function = getattr(function, '__wrapped__', function)
+    digest.update(f'{function.__module__}.{function.__qualname__}'.encode())
+    code = getattr(function, '__code__', None)
+    if code is not None:
+        digest.update(code.co_code)
+        _update(digest, [getattr(const, 'co_code', const) for const in code.co_consts])
+    for cell in getattr(function, '__closure__', None) or ():
+        _update(digest, cell.cell_contents)
+    if bound_to is not None and not isinstance(bound_to, type(os)):
+        _update(digest, bound_to)
+
+
+@functools.lru_cache(maxsize=None)
+def source_fingerprint(module_name):
+    """SHA-256 of the .py files of the top-level package of `module_name` (or of the module's file).
+
+    Computed once per process; empty for modules without source files.
+    """
+    top = sys.modules.get(module_name.split('.')[0]) or sys.modules.get(module_name)
+    location = getattr(top, '__file__', None)
+    if location is None:
+        return ''
+    location = Path(location)
+    files = sorted(location.parent.rglob('*.py')) if location.name == '__init__.py' else [location]
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(str(path.relative_to(location.parent)).encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def content_key(function, args=(), kwargs=None):
+    """Hex SHA-256 of `function`, the sources of its package and its arguments."""
+    digest = hashlib.sha256(f'memo:{KEY_VERSION}'.encode())
+    unwrapped = getattr(getattr(function, '__func__', function), '__wrapped__', function)
+    digest.update(source_fingerprint(getattr(unwrapped, '__module__', None) or '').encode())
+    _update_function(digest, function)
+    _update(digest, tuple(args))
+    _update(digest, kwargs or {})
+    return digest.hexdigest()
+
+
+def _function_name(function):
+    function = getattr(function, '__func__', function)
+    return f'{function.__module__}.{function.__qualname__}'.replace('<', '').replace('>', '')
+
+
+class MemoCache:
+    """Content-addressed cache of function results on disk with LRU eviction.
+
+    `max_bytes` and `max_entries` bound the cache (None for no bound); `enabled=False`
+    turns every call into a plain call.
+    """
+
+    def __init__(self, directory=DEFAULT_DIRECTORY, max_bytes=1 << 30, max_entries=None, enabled=True):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, function, key):
+        return self.directory / _function_name(function) / f'{key}.pkl'
+
+    @stage('memo')
+    def call(self, function, *args, **kwargs):
+        """`function(*args, **kwargs)`, read from the cache when the same call was made before.
+
+        Runs as the 'memo' stage, so hits and misses are counted in run reports even when
+        the call is made outside any other stage.
+        """
+        if not self.enabled:
+            return function(*args, **kwargs)
+        path = self._path(function, content_key(function, args, kwargs))
+        if path.exists():
+            try:
+                with open(path, 'rb') as entry:
+                    result = pickle.load(entry)
+            except (OSError, EOFError, pickle.UnpicklingError):
+                path.unlink(missing_ok=True)  #Truncated or unreadable: recompute
+            else:
+                os.utime(path)  #Most recently used
+                self.hits += 1
+                count('memo_hit')
+                return result
+
+        self.misses += 1
+        count('memo_miss')
+        result = function(*args, **kwargs)
+        self._store(path, result)
+        return result
+
+    def memoize(self, function):
+        """Decorator form of `call`."""
+        def wrapper(*args, **kwargs):
+            return self.call(function, *args, **kwargs)
+        wrapper.__wrapped__ = function
+        wrapper.__name__ = getattr(function, '__name__', 'memoized')
+        wrapper.__doc__ = function.__doc__
+        return wrapper
+
+    def _store(self, path, result):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+        with open(tmp, 'wb') as entry:
+            pickle.dump(result, entry, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self.evict()
+
+    def entries(self):
+        """(path, size, last use) of every entry, least recently used first."""
+        found = []
+        for path in self.directory.glob('*/*.pkl'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  #Evicted by another process
+                continue
+            found.append((path, stat.st_size, stat.st_mtime))
+        return sorted(found, key=lambda entry: entry[2])
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Remove least recently used entries until the cache is within its bounds."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        while entries and ((self.max_bytes is not None and total > self.max_bytes)
+                           or (self.max_entries is not None and len(entries) > self.max_entries)):
+            path, size, _ = entries.pop(0)
+            path.unlink(missing_ok=True)
+            total -= size
+
+    def invalidate(self, function=None, *args, **kwargs):
+        """Drop cached results: of one call if arguments are given, of `function`, or all of them."""
+        if function is None:
+            paths = self.directory.glob('*/*.pkl')
+        elif args or kwargs:
+            paths = [self._path(function, content_key(function, args, kwargs))]
+        else:
+            paths = (self.directory / _function_name(function)).glob('*.pkl')
+        removed = 0
+        for path in list(paths):
+            if path.exists():
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def clear(self):
+        return self.invalidate()
+
+    def prune(self, older_than):
+        """Drop entries not used in the last `older_than` seconds."""
+        cutoff = time.time() - older_than
+        stale = [path for path, _, used in self.entries() if used < cutoff]
+        for path in stale:
+            path.unlink(missing_ok=True)
+        return len(stale)
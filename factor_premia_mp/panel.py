@@ -0,0 +1,50 @@
+"""Date alignment on integer period keys.
+
+Dates are reduced to the number of whole periods since 1970 (months by default)
+with datetime64 unit casts, and joins are done with sorted `searchsorted` lookups
+on those integers instead of hashing "%b-%Y" strings.
+"""
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.instrument import stage
+
+
+def period_key(dates, freq='M'):
+    """int64 period number of each date: 'M' months, 'W' weeks or 'D' days since 1970-01-01."""
+    dates = np.asarray(pd.to_datetime(dates), dtype='datetime64[ns]')
+    return dates.astype(f'datetime64[{freq}]').astype('int64')
+
+
+def align_on_period(left_dates, right_dates, freq='M'):
+    """Row positions of an inner many-to-one join of `left_dates` to `right_dates` on period keys.
+
+    Every left row is matched with the right row of the same period; right keys must
+    be unique. Returns (left_positions, right_positions), ordered like `left_dates`.
+    """
+    left_keys = period_key(left_dates, freq)
+    right_keys = period_key(right_dates, freq)
+
+    order = np.argsort(right_keys, kind='stable')
+    sorted_keys = right_keys[order]
+    if np.any(sorted_keys[1:] == sorted_keys[:-1]):
+        raise ValueError(f"The right-hand dates have more than one observation per '{freq}' period.")
+
+    position = np.searchsorted(sorted_keys, left_keys).clip(max=max(len(sorted_keys) - 1, 0))
+    found = sorted_keys[position] == left_keys if len(sorted_keys) else np.zeros(len(left_keys), bool)
+    return np.flatnonzero(found), order[position[found]]
+
+
+@stage('merge')
+def merge_stance_factors(mp_stance, clean_factor_premia, freq='M'):
+    """`monthly_full_df`: MPSTANCE and the factor premia matched by period, indexed by the factor "Date".
+
+    Factor rows can be at a finer frequency than the stance (e.g. daily premia with a
+    monthly stance); each row picks up the stance of its period.
+    """
+    factor_rows, stance_rows = align_on_period(clean_factor_premia['Date'], mp_stance['observation_date'], freq)
+
+    monthly_full_df = clean_factor_premia.iloc[factor_rows].set_index('Date')
+    monthly_full_df.insert(0, 'MPSTANCE', mp_stance['MPSTANCE'].to_numpy()[stance_rows])
+    return monthly_full_df
@@ -0,0 +1,179 @@
+"""Binary, memory-mapped store of `monthly_full_df`.
+
+A store is a directory with three files:
+
+    values-<generation>.bin   the panel as one column-major matrix (each column's rows are contiguous)
+    dates-<generation>.i8     the date index as int64 nanoseconds
+    meta.json                 columns, dtype, number of rows, the index name and the generation
+
+A write puts its data files under a new generation and only then replaces
+meta.json, so a reader always opens the values and dates that its metadata
+describes; the previous generation is removed afterwards.
+
+Opening a store reads meta.json and maps the `values-<generation>.bin` it names
+read-only instead of parsing text. A reader that races a write, reading the old
+meta.json and then finding that generation already removed, reads meta.json
+again and opens the new generation. Loading costs nothing up front, and every
+process that opens the same store shares one copy of the panel in the page
+cache. Because the matrix is column-major, a column, or a run of adjacent
+columns such as the factor asset columns, is a view of the mapping;
+`PanelStore` hands these out as Series and DataFrames that the regression, VIF
+and lag-search functions accept in place of the DataFrame.
+
+A float32 store halves the file and the cache footprint; the model code casts
+the columns it uses to float64, so those are copied once per call.
+"""
+
+import json
+import os
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.instrument import annotate, count, stage
+
+STORE_VERSION = 2
+META_FILE = 'meta.json'
+
+
+def _data_files(directory, generation):
+    return directory / f'values-{generation}.bin', directory / f'dates-{generation}.i8'
+
+
+def _read_meta(directory):
+    return json.loads((directory / META_FILE).read_text())
+
+
+@stage('write_store')
+def write_panel(frame, directory, dtype='float64'):
+    """Write `frame` (a date index and numeric columns) as a store in `directory`.
+
+    The data files get names of their own and the metadata file is replaced last, so
+    readers never see values and metadata from different writes.
+    """
+    dtype = np.dtype(dtype)
+    if dtype not in (np.dtype('float32'), np.dtype('float64')):
+        raise ValueError(f'dtype must be float32 or float64, not {dtype}.')
+    non_numeric = [column for column, kind in frame.dtypes.items() if not pd.api.types.is_numeric_dtype(kind)]
+    if non_numeric:
+        raise TypeError(f'Columns are not numeric: {non_numeric}')
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    n_rows, n_columns = frame.shape
+
+    previous = _read_meta(directory).get('generation') if (directory / META_FILE).exists() else None
+    generation = uuid.uuid4().hex[:16]
+    values_path, dates_path = _data_files(directory, generation)
+
+    values = np.memmap(values_path, dtype=dtype, mode='w+', shape=(n_columns, max(n_rows, 1)))
+    for i, (_, column) in enumerate(frame.items()):
+        values[i, :n_rows] = column.to_numpy(dtype=float)  #Column by column: no (T, k) float64 temporary
+    values.flush()
+    del values
+
+    dates = np.asarray(pd.to_datetime(frame.index), dtype='datetime64[ns]').astype('int64')
+    dates.tofile(dates_path)
+
+    meta = {
+        'version': STORE_VERSION,
+        'generation': generation,
+        'columns': [str(column) for column in frame.columns],
+        'dtype': dtype.str,
+        'n_rows': n_rows,
+        'index_name': frame.index.name or 'Date',
+    }
+    tmp = directory / (META_FILE + '.tmp')
+    tmp.write_text(json.dumps(meta))
+    os.replace(tmp, directory / META_FILE)
+
+    if previous is not None and previous != generation:
+        for path in _data_files(directory, previous):
+            path.unlink(missing_ok=True)  #Readers that mapped it keep their mapping
+    return PanelStore(directory)
+
+
+class PanelStore:
+    """Read-only, memory-mapped panel written by `write_panel`.
+
+    Indexing follows a DataFrame: `store[column]` is a Series and `store[columns]` a
+    DataFrame, both indexed by date. They are views of the mapping when the columns
+    are adjacent in the store and copies of the selected columns otherwise.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        try:
+            self._open(_read_meta(self.directory))
+        except FileNotFoundError:
+            #The generation in the metadata we read was replaced before its files were opened
+            self._open(_read_meta(self.directory))
+
+    def _open(self, meta):
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f'{self.directory} is a version {meta.get("version")} store, '
+                             f'expected {STORE_VERSION}.')
+        self.columns = pd.Index(meta['columns'])
+        self.dtype = np.dtype(meta['dtype'])
+        n_rows = meta['n_rows']
+
+        values_path, dates_path = _data_files(self.directory, meta['generation'])
+        mapped = np.memmap(values_path, dtype=self.dtype, mode='r',
+                           shape=(len(self.columns), max(n_rows, 1)))
+        self._by_column = np.asarray(mapped)[:, :n_rows]  #(k, T); its transpose is the (T, k) panel
+        dates = np.fromfile(dates_path, dtype='int64')
+        self.index = pd.DatetimeIndex(dates.view('datetime64[ns]'), name=meta['index_name'])
+        self._position = {column: i for i, column in enumerate(self.columns)}
+
+    @property
+    def values(self):
+        """The whole panel as a (T, k) Fortran-ordered view."""
+        return self._by_column.T
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, column):
+        return column in self._position
+
+    def positions(self, columns):
+        """Store positions of `columns`; raises KeyError for unknown names."""
+        missing = [column for column in columns if column not in self._position]
+        if missing:
+            raise KeyError(f'Columns not in the store: {missing}')
+        return [self._position[column] for column in columns]
+
+    def array(self, columns=None):
+        """(T, len(columns)) array of `columns` (default all): a view when they are adjacent, in order."""
+        if columns is None:
+            return self.values
+        if isinstance(columns, str):
+            return self._by_column[self.positions([columns])[0]]
+        positions = self.positions(list(columns))
+        if positions and positions == list(range(positions[0], positions[0] + len(positions))):
+            return self._by_column[positions[0]:positions[-1] + 1].T
+        count('store_copy')  #Non-adjacent columns are gathered into a new array
+        return self._by_column[positions].T
+
+    def __getitem__(self, columns):
+        if isinstance(columns, str):
+            return pd.Series(self.array(columns), index=self.index, name=columns, copy=False)
+        columns = list(columns)
+        return pd.DataFrame(self.array(columns), index=self.index, columns=columns, copy=False)
+
+    def frame(self, columns=None):
+        """The panel (or `columns` of it) as a DataFrame over the mapping."""
+        return self[list(self.columns) if columns is None else columns]
+
+
+@stage('load')
+def open_panel(directory):
+    """`PanelStore` of the store in `directory`."""
+    annotate(path=str(directory))
+    return PanelStore(directory)
@@ -0,0 +1,58 @@
+"""The analysis as stages that run on local files.
+
+    data -> stance -> regression, lags, plot
+
+Each stage takes the previous stage's output, so a batch job only runs (and
+imports) what it needs. The input workbooks are read through the snapshot cache
+of `factor_premia_mp.data`.
+"""
+
+from pathlib import Path
+
+from factor_premia_mp import data, panel, stance
+
+INPUT_FILES = {
+    'fedfunds': 'fedfunds.xls',
+    'rstar': 'r_star.xlsx',
+    'spf': 'spf_10_yr_inflation_expectation.xlsx',
+    'factor_premia': 'Century of Factor Premia Monthly.xlsx',
+}
+LAST_X_COLUMN = 'All Stock Selection Value'  #Regressors are the columns before this one
+
+
+def load_inputs(data_dir='.', cache_dir=None, refresh=False):
+    """The four cleaned inputs, keyed like `data.READERS`, from the workbooks in `data_dir`."""
+    data_dir = Path(data_dir)
+    return {kind: data.load(data_dir / name, kind, cache_dir, refresh) for kind, name in INPUT_FILES.items()}
+
+
+def build_panel(inputs, start=stance.STANCE_START, freq='M'):
+    """(mp_stance, monthly_full_df) from the output of `load_inputs`."""
+    mp_stance = stance.build_mp_stance(inputs['fedfunds'], inputs['rstar'], inputs['spf'], start)
+    return mp_stance, panel.merge_stance_factors(mp_stance, inputs['factor_premia'], freq)
+
+
+def factor_asset_columns(monthly_full_df):
+    """Factor premia across asset classes: the columns after MPSTANCE and before "All Stock Selection Value"."""
+    columns = list(monthly_full_df.columns)
+    return columns[1:columns.index(LAST_X_COLUMN)]
+
+
+def regression(monthly_full_df, y_variable='MPSTANCE', x_columns=None, windows=(60, 120, None)):
+    """`window_panel` fits of `y_variable` on `x_columns` (default `factor_asset_columns`).
+
+    The last date of the "expanding" window is the full-sample OLS, matching `sm.OLS` up to
+    the rounding-level directions of the collinear Multi-style columns (see `rolling_ols`).
+    """
+    from factor_premia_mp.regression import window_panel
+
+    x_columns = factor_asset_columns(monthly_full_df) if x_columns is None else x_columns
+    return window_panel(monthly_full_df, y_variable, x_columns, windows)
+
+
+def lag_search(monthly_full_df, y_variable='MPSTANCE', x_columns=None, max_lag=12):
+    """Best Granger lag of each of `x_columns` in both directions (see `bidirectional_best_lags`)."""
+    from factor_premia_mp.lag_search import bidirectional_best_lags
+
+    x_columns = factor_asset_columns(monthly_full_df) if x_columns is None else x_columns
+    return bidirectional_best_lags(x_columns, y_variable, monthly_full_df, max_lag)
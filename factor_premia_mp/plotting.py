@@ -0,0 +1,39 @@
+"""Figures of the analysis.
+
+matplotlib and seaborn are imported inside the plotting functions, so importing the
+package (or running any other stage) does not pay for them.
+"""
+
+import pandas as pd
+
+
+def plot_mp_stance(mp_stance, ax=None, start='1991-01-01', end='2023-12-31'):
+    """Line chart of MPSTANCE against observation_date with a zero line; returns the figure."""
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    sns.set(style='ticks')
+    mp_stance_graph = mp_stance.assign(observation_date=pd.to_datetime(mp_stance['observation_date']))
+
+    if ax is None:
+        fig, ax = plt.subplots(figsize=(10, 6))
+    else:
+        fig = ax.figure
+
+    sns.lineplot(data=mp_stance_graph, x='observation_date', y='MPSTANCE', ax=ax, linewidth=2)
+
+    ax.axhline(0, color='black', linewidth=1.5, linestyle='--')
+    ax.yaxis.set_tick_params(width=1.5, color='black')
+    ax.set_xlim([pd.to_datetime(start), pd.to_datetime(end)])
+
+    #Yearly ticks every 5 years
+    ax.xaxis.set_major_locator(mdates.YearLocator(base=5))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y'))
+    ax.tick_params(axis='x', labelrotation=45)
+    ax.set_xlabel('Year')
+
+    ax.set_title('A Measure of Stance of Monetary Policy')
+    ax.set_ylabel('Percentage (%)')
+    fig.tight_layout()
+    return fig
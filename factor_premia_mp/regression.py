@@ -0,0 +1,218 @@
+"""Rolling and expanding-window OLS from QR factors of the window rows.
+
+Each window is solved from the upper-triangular R factor of its rows [X y], never
+from X'X, so the condition number is not squared. Moving a window one month
+forward changes R by Givens rotations: adding a row is an O(k²) update and
+dropping the oldest row of a rolling window an O(k²) downdate. A rolling
+window's R is recomputed from its rows every `window` steps, and whenever a
+downdate fails, so rounding cannot build up. A window whose R is clearly well
+conditioned is solved by back substitution; otherwise the SVD of R gives the
+solution, the numerical rank and the unscaled covariance, with the same cutoffs
+as `sm.OLS` (`pinv` with rcond=1e-15 and `matrix_rank` on the singular values).
+Only one window's k x k factor is held at a time.
+"""
+
+import math
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import blas, lapack
+
+from factor_premia_mp.instrument import stage
+
+WindowedFit = namedtuple('WindowedFit', ['coefficients', 'fit'])
+LeastSquares = namedtuple('LeastSquares', ['coef', 'ssr', 'cov_diag', 'rank'])
+
+PINV_RCOND = 1e-15  #statsmodels' default for the pinv method
+TRIANGULAR_RCOND = 1e-8  #Estimated reciprocal condition above which R is solved directly
+
+
+def _solve_triangular(r, n_terms):
+    """`solve_from_r` for a full-rank, square R of X, or None when R is not clearly well conditioned."""
+    r_xx = r[:n_terms, :n_terms]
+    reciprocal, info = lapack.dtrcon(r_xx, norm='1', uplo='U')
+    if info != 0 or not reciprocal > TRIANGULAR_RCOND:
+        return None
+    r_inv, info = lapack.dtrtri(r_xx, lower=0)
+    if info != 0:
+        return None
+    coef, info = lapack.dtrtrs(r_xx, r[:n_terms, n_terms:], lower=0)
+    if info != 0:
+        return None
+    z = r[n_terms:, n_terms:]
+    ssr = np.einsum('im,im->m', z, z)
+    return LeastSquares(coef, ssr, np.einsum('ij,ij->i', r_inv, r_inv), n_terms)
+
+
+def solve_from_r(r, n_terms, rcond=PINV_RCOND):
+    """Least squares of the last columns on the first `n_terms` from the R factor of [X Y].
+
+    Returns `LeastSquares(coef, ssr, cov_diag, rank)`: coef is (n_terms, m), ssr (m,),
+    cov_diag the diagonal of (X'X)^+ and rank the numerical rank of X, as `sm.OLS`
+    computes it. Singular values below `rcond` times the largest are dropped. When R
+    is well conditioned, where the pseudo-inverse and the inverse agree, the solution
+    is a triangular solve instead of an SVD.
+    """
+    if r.shape[0] >= n_terms and rcond < TRIANGULAR_RCOND:
+        solution = _solve_triangular(r, n_terms)
+        if solution is not None:
+            return solution
+
+    r_xx, z = r[:, :n_terms], r[:, n_terms:]
+    u, s, vt = np.linalg.svd(r_xx, full_matrices=False)
+    largest = s[0] if len(s) else 0.0
+    keep = s > rcond * largest
+    rank = int(np.sum(s > largest * max(len(s), 1) * np.finfo(float).eps))
+
+    projected = u[:, keep].T @ z
+    coef = vt[keep].T @ (projected / s[keep, None])
+    residual = z - u[:, keep] @ projected
+    ssr = np.einsum('im,im->m', residual, residual)
+    cov_diag = np.sum((vt[keep] / s[keep, None]) ** 2, axis=0)
+    return LeastSquares(coef, ssr, cov_diag, rank)
+
+
+def _add_row(r, row):
+    """Rotate `row` into the square R factor `r` in place (Givens, O(k²))."""
+    row = row.copy()
+    for j in range(len(row)):
+        if row[j] != 0:
+            c, s = blas.drotg(r[j, j], row[j])
+            blas.drot(r[j, j:], row[j:], c, s, overwrite_x=True, overwrite_y=True)
+
+
+def _drop_row(r, row):
+    """Remove `row` from the square R factor `r` in place (LINPACK dchdd, O(k²)).
+
+    Returns False, leaving `r` unusable, when R is singular or the downdate would
+    lose positive definiteness to rounding; the caller then refactors the window.
+    """
+    a, info = lapack.dtrtrs(r, row, lower=0, trans=1)
+    if info != 0:
+        return False
+    alpha_squared = 1 - a @ a
+    if not alpha_squared > 0:
+        return False
+    alpha = math.sqrt(alpha_squared)
+    rotations = []
+    for i in range(len(row) - 1, -1, -1):
+        norm = math.hypot(alpha, a[i])
+        rotations.append((i, alpha / norm, a[i] / norm))
+        alpha = norm
+    dropped = np.zeros(len(row))
+    for i, c, s in rotations:
+        blas.drot(dropped[i:], r[i, i:], c, s, overwrite_x=True, overwrite_y=True)
+    return True
+
+
+def _factor(rows):
+    """Square R factor of `rows`, padded with zero rows when there are fewer rows than columns."""
+    r = np.zeros((rows.shape[1], rows.shape[1]))
+    if len(rows):
+        factor = np.linalg.qr(rows, mode='r')
+        r[:len(factor)] = factor
+    return r
+
+
+@stage('ols')
+def rolling_ols(y, X, window=None, add_constant=True, min_nobs=None):
+    """OLS of `y` on `X` over every trailing `window` rows, or expanding when `window` is None.
+
+    Rows with a missing value are skipped. Returns `WindowedFit(coefficients, fit)`:
+    `coefficients` is a tidy frame indexed by (date, term) with coef, std_err and t_stat,
+    and `fit` has r_squared, adj_r_squared, nobs and rank per date. Both follow the index
+    of `X`; dates whose window has fewer than `min_nobs` rows (default k + 1) are NaN.
+    The residual degrees of freedom are nobs - rank, and standard errors are NaN in
+    windows where X is rank deficient. R² is centered when the design has a constant,
+    as in `sm.OLS`, whose full-sample results the last expanding window reproduces.
+    """
+    index = X.index if hasattr(X, 'index') else pd.RangeIndex(len(X))
+    terms = list(X.columns) if hasattr(X, 'columns') else [f'x{i}' for i in range(np.shape(X)[1])]
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if add_constant:
+        X = np.column_stack([np.ones(len(X)), X])
+        terms = ['const'] + terms
+
+    n_rows, n_terms = X.shape
+    has_constant = bool(np.any((np.ptp(X, axis=0) == 0) & (X[0] != 0)))
+    min_nobs = n_terms + 1 if min_nobs is None else min_nobs
+
+    valid = ~(np.isnan(y) | np.isnan(X).any(axis=1))
+    rows = np.column_stack([X, y])
+
+    coef = np.full((n_rows, n_terms), np.nan)
+    std_err = np.full((n_rows, n_terms), np.nan)
+    ssr, tss, nobs, rank = (np.full(n_rows, np.nan) for _ in range(4))
+
+    r = np.zeros((n_terms + 1, n_terms + 1))
+    count, mean, m2 = 0, 0.0, 0.0  #Running centered sum of squares of y (Welford)
+    for t in range(n_rows):
+        if window is None:
+            if valid[t]:
+                _add_row(r, rows[t])
+                count += 1
+                delta = y[t] - mean
+                mean += delta / count
+                m2 += delta * (y[t] - mean)
+        else:
+            first = t - window + 1
+            if t % window == 0:
+                #Refactor from the rows now and then so rotation rounding does not build up
+                in_window = slice(max(0, first), t + 1)
+                r = _factor(rows[in_window][valid[in_window]])
+            else:
+                if valid[t]:
+                    _add_row(r, rows[t])
+                if first > 0 and valid[first - 1] and not _drop_row(r, rows[first - 1]):
+                    in_window = slice(first, t + 1)
+                    r = _factor(rows[in_window][valid[in_window]])
+            window_y = y[max(0, first):t + 1][valid[max(0, first):t + 1]]
+            count = len(window_y)
+        nobs[t] = count
+        if count < min_nobs:
+            continue
+
+        if window is not None:
+            m2 = np.sum((window_y - window_y.mean()) ** 2)
+        solution = solve_from_r(r, n_terms)
+        coef[t] = solution.coef[:, 0]
+        ssr[t] = solution.ssr[0]
+        rank[t] = solution.rank
+        tss[t] = m2 if has_constant else np.sum(r[:, -1] ** 2)
+        if solution.rank == n_terms:
+            std_err[t] = np.sqrt(solution.cov_diag * ssr[t] / (count - solution.rank))
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        df_resid = nobs - rank
+        r_squared = 1 - ssr / tss
+        adj_r_squared = 1 - (1 - r_squared) * (nobs - has_constant) / df_resid
+        t_stat = coef / std_err
+
+    ready = nobs >= min_nobs
+    fit = pd.DataFrame({'r_squared': r_squared, 'adj_r_squared': adj_r_squared, 'nobs': nobs, 'rank': rank},
+                       index=index)
+    fit.loc[~ready] = np.nan
+
+    panel_index = pd.MultiIndex.from_product([index, terms], names=[index.name or 'Date', 'term'])
+    coefficients = pd.DataFrame({
+        'coef': coef.ravel(),
+        'std_err': std_err.ravel(),
+        't_stat': t_stat.ravel(),
+    }, index=panel_index)
+    return WindowedFit(coefficients, fit)
+
+
+def window_panel(data_frame, y_variable, x_columns, windows=(60, 120, None)):
+    """`rolling_ols` of `y_variable` on `x_columns` for several windows, stacked by a "window" level.
+
+    A window of None is labelled "expanding".
+    """
+    coefficients, fits = {}, {}
+    for window in windows:
+        label = 'expanding' if window is None else window
+        result = rolling_ols(data_frame[y_variable], data_frame[list(x_columns)], window)
+        coefficients[label] = result.coefficients
+        fits[label] = result.fit
+    return WindowedFit(pd.concat(coefficients, names=['window']), pd.concat(fits, names=['window']))
@@ -0,0 +1,154 @@
+"""Block bootstrap and permutation inference for the OLS specifications.
+
+Monthly factor premia and MPSTANCE are serially correlated, so resampling is
+done in blocks: moving blocks of fixed length or the stationary bootstrap of
+Politis and Romano (1994) with geometric block lengths. Replicates are drawn as
+index arrays and fitted as batched normal-equation solves, in chunks that can be
+spread over a process pool. Each chunk has its own seed from one SeedSequence,
+so results do not depend on the number of workers.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.shared import shared_pool, worker_array
+
+ResamplingResult = namedtuple('ResamplingResult', ['replicates', 'summary'])
+
+
+def moving_block_indices(n_obs, block_length, n_reps, rng):
+    """(n_reps, n_obs) row indices built from blocks of `block_length` consecutive rows."""
+    n_blocks = -(-n_obs // block_length)
+    starts = rng.integers(0, n_obs - block_length + 1, size=(n_reps, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_length)
+    return indices.reshape(n_reps, -1)[:, :n_obs]
+
+
+def stationary_indices(n_obs, block_length, n_reps, rng):
+    """(n_reps, n_obs) row indices of the stationary bootstrap with mean block length `block_length`.
+
+    Each row starts a new block with probability 1 / block_length; blocks wrap around.
+    """
+    new_block = rng.random((n_reps, n_obs)) < 1 / block_length
+    new_block[:, 0] = True
+    starts = rng.integers(0, n_obs, size=(n_reps, n_obs))
+
+    positions = np.broadcast_to(np.arange(n_obs), (n_reps, n_obs))
+    block_start = np.maximum.accumulate(np.where(new_block, positions, 0), axis=1)
+    first_row = np.take_along_axis(starts, block_start, axis=1)
+    return (first_row + positions - block_start) % n_obs
+
+
+def block_permutation_indices(n_obs, block_length, n_reps, rng):
+    """(n_reps, n_obs) permutations that shuffle blocks of `block_length` rows (1 = plain permutation)."""
+    if block_length <= 1:
+        return rng.permuted(np.broadcast_to(np.arange(n_obs), (n_reps, n_obs)), axis=1)
+    n_blocks = -(-n_obs // block_length)
+    blocks = np.arange(n_blocks * block_length).reshape(n_blocks, block_length)
+    blocks[blocks >= n_obs] = -1  #Padding of the short last block
+
+    order = np.argsort(rng.random((n_reps, n_blocks)), axis=1)
+    indices = blocks[order].reshape(n_reps, -1)
+    return indices[indices >= 0].reshape(n_reps, n_obs)
+
+
+SAMPLERS = {
+    'stationary': stationary_indices,
+    'moving': moving_block_indices,
+}
+
+
+def batched_ols(X, y):
+    """Coefficients and R² of a stack of regressions: X is (R, n, k), y is (R, n).
+
+    R² is centered when the first column is a constant.
+    """
+    xx = np.einsum('rni,rnj->rij', X, X)
+    xy = np.einsum('rni,rn->ri', X, y)
+    coef = np.einsum('rij,rj->ri', np.linalg.pinv(xx, hermitian=True), xy)
+    residual = y - np.einsum('rni,ri->rn', X, coef)
+    centered = np.all(X[:, :, 0] == 1)
+    deviations = y - y.mean(axis=1, keepdims=True) if centered else y
+    r_squared = 1 - np.einsum('rn,rn->r', residual, residual) / np.einsum('rn,rn->r', deviations, deviations)
+    return coef, r_squared
+
+
+def _resample(X, y, task):
+    kind, method, block_length, n_reps, seed = task
+    rng = np.random.default_rng(seed)
+    if kind == 'bootstrap':
+        rows = SAMPLERS[method](len(y), block_length, n_reps, rng)
+        return batched_ols(X[rows], y[rows])
+    rows = block_permutation_indices(len(y), block_length, n_reps, rng)
+    return batched_ols(np.broadcast_to(X, (n_reps,) + X.shape), y[rows])
+
+
+def _resample_chunk(task):
+    return _resample(worker_array('X'), worker_array('y'), task)
+
+
+def _run(kind, y, X, method, block_length, n_reps, add_constant, n_jobs, seed, chunk_size):
+    terms = list(X.columns) if hasattr(X, 'columns') else [f'x{i}' for i in range(np.shape(X)[1])]
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if add_constant:
+        X = np.column_stack([np.ones(len(X)), X])
+        terms = ['const'] + terms
+
+    estimate, r_squared = batched_ols(X[None], y[None])
+    chunks = [min(chunk_size, n_reps - start) for start in range(0, n_reps, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(kind, method, block_length, size, child) for size, child in zip(chunks, seeds)]
+
+    if n_jobs == 1:
+        results = [_resample(X, y, task) for task in tasks]
+    else:
+        with shared_pool(n_jobs, X=X, y=y) as pool:
+            results = list(pool.map(_resample_chunk, tasks))
+
+    coef = np.concatenate([chunk_coef for chunk_coef, _ in results])
+    replicate_r_squared = np.concatenate([chunk_r2 for _, chunk_r2 in results])
+    replicates = pd.DataFrame(coef, columns=terms)
+    replicates['r_squared'] = replicate_r_squared
+    return replicates, pd.Series(np.append(estimate[0], r_squared[0]), index=terms + ['r_squared'])
+
+
+def bootstrap_ols(y, X, n_reps=2000, method='stationary', block_length=12, add_constant=True,
+                  n_jobs=1, seed=None, chunk_size=250, alpha=0.05):
+    """Block-bootstrap distribution of every coefficient and of R².
+
+    The summary has the full-sample estimate, bootstrap standard error, percentile
+    interval and a two-sided p-value for a zero coefficient from the bootstrap
+    distribution re-centered at the estimate.
+    """
+    replicates, estimate = _run('bootstrap', y, X, method, block_length, n_reps, add_constant,
+                                n_jobs, seed, chunk_size)
+    centered = replicates - estimate
+    summary = pd.DataFrame({
+        'estimate': estimate,
+        'std_err': replicates.std(ddof=1),
+        'ci_lower': replicates.quantile(alpha / 2),
+        'ci_upper': replicates.quantile(1 - alpha / 2),
+        'p_value': (1 + (centered.abs() >= estimate.abs()).sum()) / (1 + n_reps),
+    })
+    return ResamplingResult(replicates, summary)
+
+
+def permutation_test_ols(y, X, n_reps=2000, block_length=12, add_constant=True,
+                         n_jobs=1, seed=None, chunk_size=250):
+    """Permutation distribution of the coefficients and R² with `y` shuffled in blocks.
+
+    Shuffling whole blocks keeps the serial correlation of `y` under the null of no
+    relation with `X`. p-values are (1 + #{|stat*| >= |stat|}) / (1 + n_reps).
+    """
+    replicates, estimate = _run('permutation', y, X, None, block_length, n_reps, add_constant,
+                                n_jobs, seed, chunk_size)
+    summary = pd.DataFrame({
+        'estimate': estimate,
+        'null_mean': replicates.mean(),
+        'null_std': replicates.std(ddof=1),
+        'p_value': (1 + (replicates.abs() >= estimate.abs()).sum()) / (1 + n_reps),
+    })
+    return ResamplingResult(replicates, summary)
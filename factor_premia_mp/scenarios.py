@@ -0,0 +1,195 @@
+"""Monetary policy stance under many definitions at once.
+
+A scenario picks a policy rate (the fed funds rate, a shadow rate, ...), an r-star
+estimate, an inflation expectation and how the lower-frequency components are
+filled onto the rate's dates ('ffill' the latest observation, 'linear' between
+observations, which uses the next observation and so looks ahead, or
+'linear_lagged', the linear path delayed by one observation, which does not):
+
+    MP_t = rate_t - (r*_t + E[π]_t)
+
+Each distinct (series, fill) is aligned to the dates once, and the stance of every
+scenario is one indexed subtraction over those aligned columns, giving a (T, m)
+matrix. Downstream, the scenarios are a multi-target batch: the OLS on the factor
+premia takes one QR factorization of [X Y] for all of them, and the Granger lag
+search fits the factors on their own lags once per lag and adds every scenario's
+lags in one broadcast batch.
+"""
+
+from collections import namedtuple
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.instrument import stage
+from factor_premia_mp.lag_search import granger_f_pvalues_by_cause
+from factor_premia_mp.panel import align_on_period
+from factor_premia_mp.regression import solve_from_r
+from factor_premia_mp.stance import STANCE_START, asof_align, spf_with_dates
+
+StanceScenario = namedtuple('StanceScenario', ['name', 'rate', 'rstar', 'inflation', 'fill'])
+ScenarioFit = namedtuple('ScenarioFit', ['coefficients', 'fit'])
+
+FILLS = ('ffill', 'linear', 'linear_lagged')
+BASELINE = StanceScenario('baseline', 'FEDFUNDS', 'RSTAR', 'INFCPI10YR', 'ffill')
+
+
+def components_from_inputs(ffr, rff, spf):
+    """The loader outputs as {name: Series indexed by date}: FEDFUNDS, RSTAR and INFCPI10YR."""
+    if 'Date' not in spf:
+        spf = spf_with_dates(spf)
+    return {
+        'FEDFUNDS': pd.Series(ffr['FEDFUNDS'].to_numpy(dtype=float), index=pd.to_datetime(ffr['observation_date'])),
+        'RSTAR': pd.Series(rff['RSTAR'].to_numpy(dtype=float), index=pd.to_datetime(rff['Date'])),
+        'INFCPI10YR': pd.Series(spf['INFCPI10YR'].to_numpy(dtype=float), index=pd.to_datetime(spf['Date'])),
+    }
+
+
+def scenario_grid(rates=('FEDFUNDS',), rstars=('RSTAR',), inflations=('INFCPI10YR',), fills=('ffill',)):
+    """Every combination of the given component names and fill policies."""
+    scenarios = []
+    for rate, rstar, inflation, fill in product(rates, rstars, inflations, fills):
+        name = f'{rate} - ({rstar} + {inflation})' + ('' if fill == 'ffill' else f' [{fill}]')
+        scenarios.append(StanceScenario(name, rate, rstar, inflation, fill))
+    return scenarios
+
+
+def _align(dates, series, fill):
+    """`series` on `dates` under one of the `FILLS`.
+
+    'ffill' is the latest observation. 'linear' interpolates between the observations
+    around each date, so it uses a value published after the date: fine for describing
+    the stance, but it leaks the future into lagged regressions such as the Granger
+    tests. 'linear_lagged' moves along the segment between the two latest observations
+    over the following interval (observation j is reached when j + 1 is published),
+    so it only uses what was known on each date. All are NaN before they are defined
+    and hold the last value after the end.
+    """
+    if fill == 'ffill':
+        return asof_align(dates, series.index, series.to_numpy(dtype=float))
+    if fill not in FILLS:
+        raise ValueError(f'fill must be one of {FILLS}, not {fill!r}.')
+
+    values = series.to_numpy(dtype=float)
+    observed = ~np.isnan(values)
+    source = np.asarray(series.index[observed], dtype='datetime64[ns]').astype('int64')
+    order = np.argsort(source, kind='stable')
+    source, values = source[order], values[observed][order]
+    if fill == 'linear_lagged':
+        if len(source) < 2:
+            raise ValueError("'linear_lagged' needs at least two observations.")
+        #Observation j is reached at the date of j + 1; the last one an interval after its own date
+        source = np.append(source[1:], 2 * source[-1] - source[-2])
+    target = np.asarray(dates, dtype='datetime64[ns]').astype('int64')
+    aligned = np.interp(target, source, values)
+    aligned[target < source[0]] = np.nan
+    return aligned
+
+
+@stage('stance')
+def stance_matrix(components, scenarios, start=STANCE_START, dates=None):
+    """MPSTANCE of every scenario as a DataFrame with observation_date and one column per scenario.
+
+    `components` maps names to Series indexed by date. The dates default to those of
+    the first scenario's rate from `start` on; rates are aligned with 'ffill' whatever
+    the scenario's fill, which only applies to r-star and the inflation expectation.
+    """
+    scenarios = list(scenarios)
+    if dates is None:
+        rate = components[scenarios[0].rate].sort_index()
+        dates = rate.index[rate.index >= pd.to_datetime(start)]
+    dates = pd.DatetimeIndex(dates)
+
+    #Align each distinct (series, fill) once
+    columns = {}
+    for scenario in scenarios:
+        for name, fill in ((scenario.rate, 'ffill'), (scenario.rstar, scenario.fill),
+                           (scenario.inflation, scenario.fill)):
+            if (name, fill) not in columns:
+                columns[(name, fill)] = len(columns)
+    aligned = np.empty((len(dates), len(columns)))
+    for (name, fill), i in columns.items():
+        aligned[:, i] = _align(dates, components[name], fill)
+
+    rate = [columns[(scenario.rate, 'ffill')] for scenario in scenarios]
+    rstar = [columns[(scenario.rstar, scenario.fill)] for scenario in scenarios]
+    inflation = [columns[(scenario.inflation, scenario.fill)] for scenario in scenarios]
+    stance = aligned[:, rate] - (aligned[:, rstar] + aligned[:, inflation])
+
+    frame = pd.DataFrame(stance, columns=[scenario.name for scenario in scenarios])
+    frame.insert(0, 'observation_date', dates.values)
+    return frame
+
+
+@stage('merge')
+def merge_scenarios(stance, clean_factor_premia, freq='M'):
+    """(stance, factors) matched by period as in `merge_stance_factors`, both indexed by the factor "Date".
+
+    Rows where any scenario is missing are dropped, so every scenario is estimated on
+    the same sample.
+    """
+    factor_rows, stance_rows = align_on_period(clean_factor_premia['Date'], stance['observation_date'], freq)
+    factors = clean_factor_premia.iloc[factor_rows].set_index('Date')
+    stance = stance.drop(columns='observation_date').iloc[stance_rows].set_index(factors.index)
+
+    complete = stance.notna().all(axis=1).to_numpy()
+    return stance[complete], factors[complete]
+
+
+@stage('ols')
+def scenario_ols(stance, factors, add_constant=True):
+    """OLS of every scenario's stance on the same factor columns, from one QR of [X Y].
+
+    `coefficients` is indexed by (scenario, term) with coef, std_err and t_stat; `fit`
+    has r_squared, adj_r_squared, nobs and rank per scenario. Rank and cutoffs follow
+    `rolling_ols`; standard errors are NaN when X is rank deficient.
+    """
+    terms = list(factors.columns)
+    X = factors.to_numpy(dtype=float)
+    Y = stance.to_numpy(dtype=float)
+    if add_constant:
+        X = np.column_stack([np.ones(len(X)), X])
+        terms = ['const'] + terms
+    n_obs, n_terms = X.shape
+
+    solution = solve_from_r(np.linalg.qr(np.column_stack([X, Y]), mode='r'), n_terms)
+    coef, ssr = solution.coef, solution.ssr  #(terms, scenarios), (scenarios,)
+    deviations = Y - Y.mean(axis=0) if add_constant else Y
+    tss = np.einsum('ts,ts->s', deviations, deviations)
+
+    df_resid = n_obs - solution.rank
+    std_err = np.sqrt(np.outer(solution.cov_diag, ssr / df_resid))
+    if solution.rank < n_terms:
+        std_err[:] = np.nan
+    r_squared = 1 - ssr / tss
+    fit = pd.DataFrame({
+        'r_squared': r_squared,
+        'adj_r_squared': 1 - (1 - r_squared) * (n_obs - add_constant) / df_resid,
+        'nobs': n_obs,
+        'rank': solution.rank,
+    }, index=pd.Index(stance.columns, name='scenario'))
+
+    index = pd.MultiIndex.from_product([stance.columns, terms], names=['scenario', 'term'])
+    coefficients = pd.DataFrame({
+        'coef': coef.T.ravel(),
+        'std_err': std_err.T.ravel(),
+        't_stat': (coef / std_err).T.ravel(),
+    }, index=index)
+    return ScenarioFit(coefficients, fit)
+
+
+@stage('lag_search')
+def scenario_best_lags(stance, factors, max_lag=12):
+    """Best Granger lag (MPSTANCE -> factor, as in `find_best_lags`) of every factor under every scenario.
+
+    One row per (scenario, column) with Best Lag and P-Value.
+    """
+    p_values = granger_f_pvalues_by_cause(factors.to_numpy(dtype=float), stance.to_numpy(dtype=float), max_lag)
+    best = np.argmin(p_values, axis=1)  #(m, k)
+    return pd.DataFrame({
+        'Scenario': np.repeat(list(stance.columns), factors.shape[1]),
+        'Column': np.tile(list(factors.columns), stance.shape[1]),
+        'Best Lag': best.ravel() + 1,
+        'P-Value': np.take_along_axis(p_values, best[:, None, :], axis=1).ravel(),
+    })
@@ -0,0 +1,62 @@
+"""Share NumPy arrays with worker processes through shared memory.
+
+The parent copies each array into a shared memory block once, and the workers
+attach to it by name, so a task never pickles a copy of the panel.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+_worker_arrays = {}
+_worker_blocks = []
+
+
+@contextmanager
+def shared_arrays(**arrays):
+    """Copy the arrays into shared memory and yield the specs workers attach with."""
+    blocks = []
+    specs = {}
+    try:
+        for name, values in arrays.items():
+            values = np.ascontiguousarray(values)
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(values.shape, values.dtype, buffer=block.buf)[...] = values
+            specs[name] = (block.name, values.shape, values.dtype.str)
+        yield specs
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def attach(specs):
+    """Pool initializer: map the shared blocks into this worker's `_worker_arrays`."""
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        _worker_blocks.append(block)  #Keep the mapping alive for the life of the worker
+        _worker_arrays[name] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+
+def worker_array(name):
+    """Array attached by `attach`, available inside a worker task."""
+    return _worker_arrays[name]
+
+
+def resolve_jobs(n_jobs):
+    """Number of worker processes for `n_jobs` (None or -1 means every core)."""
+    if n_jobs is None or n_jobs < 0:
+        return os.cpu_count() or 1
+    return max(int(n_jobs), 1)
+
+
+@contextmanager
+def shared_pool(n_jobs, **arrays):
+    """Process pool whose workers can read `arrays` through `worker_array`."""
+    with shared_arrays(**arrays) as specs:
+        with ProcessPoolExecutor(max_workers=resolve_jobs(n_jobs), initializer=attach, initargs=(specs,)) as pool:
+            yield pool
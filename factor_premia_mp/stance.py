@@ -0,0 +1,75 @@
+"""Stance of monetary policy (Cooper, 2020).
+
+    MP_t = FF_t - (RFF*_t + 10Y IE_t)
+
+The quarterly r-star and SPF inflation expectations are aligned to the dates of
+the federal funds series with one sorted as-of lookup per component, so the fed
+funds input can be monthly, weekly or daily.
+"""
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.instrument import stage
+
+STANCE_START = '1991-10-01'  #First quarter with an SPF 10-year inflation expectation
+
+
+def spf_dates(year, quarter):
+    """First day of each (year, quarter), computed with period arithmetic instead of string parsing."""
+    months = (np.asarray(year, dtype='int64') - 1970) * 12 + (np.asarray(quarter, dtype='int64') - 1) * 3
+    return pd.to_datetime(months.astype('datetime64[M]'))
+
+
+def spf_with_dates(spf):
+    """SPF table with a "Date" column replacing "YEAR" and "QUARTER"."""
+    spf = spf.drop(['YEAR', 'QUARTER'], axis=1).assign(Date=spf_dates(spf['YEAR'], spf['QUARTER']))
+    return spf
+
+
+def asof_align(dates, source_dates, values):
+    """Latest non-missing value of `values` observed on or before each of `dates`.
+
+    This is what a left merge on the exact date followed by a forward fill gives when
+    the source dates are a subset of `dates`, but it also works when they are not.
+    """
+    source_dates = np.asarray(source_dates, dtype='datetime64[ns]')
+    values = np.asarray(values, dtype=float)
+    observed = ~np.isnan(values)
+    source_dates, values = source_dates[observed], values[observed]
+
+    order = np.argsort(source_dates, kind='stable')
+    source_dates, values = source_dates[order], values[order]
+
+    position = np.searchsorted(source_dates, np.asarray(dates, dtype='datetime64[ns]'), side='right') - 1
+    aligned = np.full(position.shape, np.nan)
+    found = position >= 0
+    aligned[found] = values[position[found]]
+    return aligned
+
+
+@stage('stance')
+def build_mp_stance(ffr, rff, spf, start=STANCE_START, keep_components=False):
+    """MPSTANCE on the dates of `ffr` from `start` onwards.
+
+    `ffr` has observation_date and FEDFUNDS at any frequency, `rff` has Date and RSTAR,
+    and `spf` has either Date or YEAR/QUARTER plus INFCPI10YR.
+    """
+    if 'Date' not in spf:
+        spf = spf_with_dates(spf)
+
+    ffr = ffr.loc[pd.to_datetime(ffr['observation_date']) >= pd.to_datetime(start)]
+    ffr = ffr.sort_values('observation_date', kind='stable')
+    dates = pd.to_datetime(ffr['observation_date']).values
+
+    mp_stance = pd.DataFrame({
+        'observation_date': dates,
+        'FEDFUNDS': ffr['FEDFUNDS'].to_numpy(dtype=float),
+        'RSTAR': asof_align(dates, rff['Date'], rff['RSTAR']),
+        'INFCPI10YR': asof_align(dates, spf['Date'], spf['INFCPI10YR']),
+    })
+    mp_stance['MPSTANCE'] = mp_stance['FEDFUNDS'] - (mp_stance['RSTAR'] + mp_stance['INFCPI10YR'])
+
+    if not keep_components:
+        mp_stance = mp_stance.drop(['FEDFUNDS', 'RSTAR', 'INFCPI10YR'], axis=1)
+    return mp_stance
@@ -0,0 +1,288 @@
+"""Forward and backward stepwise selection with incremental least-squares updates.
+
+mlxtend's `SequentialFeatureSelector` refits a `LinearRegression` for every
+candidate feature at every step. `StepwiseSelector` keeps each fold's design
+orthogonalized against the selected features (forward) or keeps the inverse
+cross-product matrix of a full-rank basis of the current features (backward), so every candidate is
+scored with a rank-one update instead of a refit. The fitted attributes
+(`k_feature_idx_`, `k_feature_names_`, `k_score_`, `subsets_`) follow mlxtend,
+and the intercept is handled by centering, as in `LinearRegression`.
+
+Because of the centering, a constant column (e.g. the `const` of
+`sm.add_constant`) never changes a score, so mlxtend would keep or drop it on
+float rounding alone. Constant columns are left out of the search and kept in
+every subset, as mlxtend does with them passed as `fixed_features`. Scores within
+`_SCORE_TOL` of each other count as tied: a step takes the first such candidate
+and 'best' the smallest such subset.
+"""
+
+import numpy as np
+from scipy import linalg
+
+from factor_premia_mp.instrument import stage
+
+_TOL = 1e-10
+_RANK_TOL = 1e-8
+_SCORE_TOL = 1e-10
+
+
+def _first_best(scores):
+    """Position of the first score within `_SCORE_TOL` of the largest."""
+    return int(np.flatnonzero(scores >= np.max(scores) - _SCORE_TOL)[0])
+
+
+def kfold_splits(n_obs, n_splits):
+    """Contiguous, unshuffled K-fold splits, as `cross_val_score(cv=n_splits)` uses for regressors."""
+    sizes = np.full(n_splits, n_obs // n_splits)
+    sizes[:n_obs % n_splits] += 1
+    stops = np.cumsum(sizes)
+    index = np.arange(n_obs)
+    return [(np.concatenate([index[:stop - size], index[stop:]]), index[stop - size:stop])
+            for size, stop in zip(sizes, stops)]
+
+
+def _splits(cv, n_obs):
+    if not cv:
+        return None  #Score in-sample, like mlxtend with cv=0
+    if isinstance(cv, (int, np.integer)):
+        return kfold_splits(n_obs, int(cv))
+    if callable(cv):
+        return cv(n_obs)  #A splitter such as `validation.walk_forward_splits`, sized to this sample
+    return [(np.asarray(train), np.asarray(test)) for train, test in cv]
+
+
+class StepwiseSelector:
+    """Sequential feature selection for linear regression scored by R².
+
+    `k_features` is 'best' (the smallest subset with the highest average score) or
+    an int; subset sizes count the constant columns, which every subset includes.
+    `cv` is 0 for in-sample R², an int for contiguous K-fold splits, an iterable
+    of (train, test) index arrays, or a function of the number of rows returning one.
+    """
+
+    def __init__(self, k_features='best', forward=True, scoring='r2', cv=5):
+        if scoring != 'r2':
+            raise ValueError("Only scoring='r2' is supported.")
+        self.k_features = k_features
+        self.forward = forward
+        self.scoring = scoring
+        self.cv = cv
+
+    @stage('stepwise')
+    def fit(self, X, y):
+        if hasattr(X, 'columns'):
+            feature_names = [str(name) for name in X.columns]
+        else:
+            feature_names = [str(i) for i in range(np.shape(X)[1])]
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        constant = [int(i) for i in np.flatnonzero(np.ptp(X, axis=0) == 0)] if len(X) else []
+        searched = [i for i in range(X.shape[1]) if i not in constant]
+        splits = _splits(self.cv, len(y))
+        if splits is None:
+            folds = [_Fold(X[:, searched], y, None, None)]
+        else:
+            folds = [_Fold(X[train][:, searched], y[train], X[test][:, searched], y[test])
+                     for train, test in splits]
+        intercept_only = (tuple(constant), np.array([fold.intercept_score() for fold in folds]))
+
+        if self.forward:
+            steps = _forward(folds, len(searched))
+        else:
+            steps = _backward(folds, len(searched))
+        steps = [(tuple(sorted(constant + [searched[i] for i in subset])), scores) for subset, scores in steps]
+        if constant:
+            steps = [intercept_only] + steps if self.forward else steps + [intercept_only]
+
+        self.subsets_ = {}
+        for subset, scores in steps:
+            self.subsets_[len(subset)] = {
+                'feature_idx': subset,
+                'cv_scores': scores,
+                'avg_score': float(np.mean(scores)),
+                'feature_names': tuple(feature_names[i] for i in subset),
+            }
+
+        if self.k_features == 'best':
+            sizes = sorted(self.subsets_)
+            best_k = sizes[_first_best(np.array([self.subsets_[k]['avg_score'] for k in sizes]))]
+        else:
+            best_k = int(self.k_features)
+
+        self.k_feature_idx_ = self.subsets_[best_k]['feature_idx']
+        self.k_feature_names_ = self.subsets_[best_k]['feature_names']
+        self.k_score_ = self.subsets_[best_k]['avg_score']
+        return self
+
+    def transform(self, X):
+        if hasattr(X, 'iloc'):
+            return X.iloc[:, list(self.k_feature_idx_)]
+        return np.asarray(X)[:, self.k_feature_idx_]
+
+
+class _Fold:
+    """Centered train/test arrays of one split; test is None for in-sample scoring."""
+
+    def __init__(self, X_train, y_train, X_test, y_test):
+        x_mean = X_train.mean(axis=0)
+        y_mean = y_train.mean()
+        self.X_train = X_train - x_mean
+        self.e_train = y_train - y_mean
+        self.scale = np.maximum(np.einsum('ij,ij->j', self.X_train, self.X_train), np.finfo(float).tiny)
+        self.in_sample = X_test is None
+        if self.in_sample:
+            self.sst = self.e_train @ self.e_train
+        else:
+            self.X_test = X_test - x_mean
+            self.e_test = y_test - y_mean
+            self.sst = np.sum((y_test - y_test.mean()) ** 2)
+
+    def intercept_score(self):
+        """Score of the intercept alone (the training mean), before any feature is added."""
+        residual = self.e_train if self.in_sample else self.e_test
+        return 1 - (residual @ residual) / self.sst
+
+
+def _forward(folds, n_features):
+    #Each fold keeps the residuals of every column and of y after projecting out
+    #the selected features; adding a feature is one rank-one update of both.
+    selected = []
+    steps = []
+    for _ in range(n_features):
+        scores = np.empty((len(folds), n_features))
+        betas = []
+        for f, fold in enumerate(folds):
+            norms = np.einsum('ij,ij->j', fold.X_train, fold.X_train)
+            dots = fold.X_train.T @ fold.e_train
+            valid = norms > _TOL * fold.scale
+            beta = np.where(valid, dots / np.where(valid, norms, 1.0), 0.0)
+            betas.append(beta)
+            if fold.in_sample:
+                sse = fold.e_train @ fold.e_train - beta * dots
+            else:
+                test_dots = fold.X_test.T @ fold.e_test
+                test_norms = np.einsum('ij,ij->j', fold.X_test, fold.X_test)
+                sse = fold.e_test @ fold.e_test - 2 * beta * test_dots + beta ** 2 * test_norms
+            scores[f] = 1 - sse / fold.sst
+
+        avg = scores.mean(axis=0)
+        avg[selected] = -np.inf
+        best = _first_best(avg)
+        selected.append(best)
+        steps.append((tuple(sorted(selected)), scores[:, best]))
+
+        for fold, beta in zip(folds, betas):
+            column = fold.X_train[:, best].copy()
+            norm = column @ column
+            if norm <= _TOL * fold.scale[best]:
+                continue  #Collinear with the selected features: nothing changes
+            loadings = (column @ fold.X_train) / norm
+            fold.X_train -= np.outer(column, loadings)
+            fold.e_train -= beta[best] * column
+            if not fold.in_sample:
+                test_column = fold.X_test[:, best].copy()
+                fold.X_test -= np.outer(test_column, loadings)
+                fold.e_test -= beta[best] * test_column
+
+    return steps
+
+
+class _BackwardState:
+    """Least-squares fit of one fold on the active features during backward elimination.
+
+    The active features are split into a full-rank basis, whose inverse cross-product
+    matrix is kept, and redundant features that are exact linear combinations of the
+    basis (e.g. a multi-style factor built from its components), stored as coefficient
+    columns of `combos`. Dropping a redundant feature, or a basis feature that one of
+    them can replace, leaves the fit unchanged.
+    """
+
+    def __init__(self, fold):
+        self.fold = fold
+        X = fold.X_train / np.sqrt(fold.scale)
+        q, r, pivots = linalg.qr(X, mode='economic', pivoting=True)
+        diag = np.abs(np.diag(r))
+        rank = int(np.sum(diag > _RANK_TOL * diag[0])) if diag.size else 0
+
+        self.basis = [int(i) for i in pivots[:rank]]
+        self.redundant = [int(i) for i in pivots[rank:]]
+        self.combos = linalg.solve_triangular(r[:rank, :rank], r[:rank, rank:])  #Normalized columns
+        self.gram_inv = np.linalg.inv(fold.X_train[:, self.basis].T @ fold.X_train[:, self.basis])
+        self.coef = self.gram_inv @ (fold.X_train[:, self.basis].T @ fold.e_train)
+
+        self.X_score = fold.X_train if fold.in_sample else fold.X_test
+        y_score = fold.e_train if fold.in_sample else fold.e_test
+        self.residual = y_score - self.X_score[:, self.basis] @ self.coef
+
+    def score(self):
+        return 1 - (self.residual @ self.residual) / self.fold.sst
+
+    def drop_scores(self, active):
+        """Score after dropping each feature of `active`."""
+        scores = np.full(len(active), self.score())
+        position = {feature: i for i, feature in enumerate(self.basis)}
+        replaceable = np.any(np.abs(self.combos) > _RANK_TOL, axis=1)
+
+        shift = self.coef / np.diag(self.gram_inv)
+        moves = self.X_score[:, self.basis] @ self.gram_inv
+        sse = (self.residual @ self.residual + 2 * shift * (moves.T @ self.residual)
+               + shift ** 2 * np.einsum('ij,ij->j', moves, moves))
+        for i, feature in enumerate(active):
+            j = position.get(feature)
+            if j is not None and not replaceable[j]:
+                scores[i] = 1 - sse[j] / self.fold.sst
+        return scores
+
+    def drop(self, feature):
+        if feature in self.redundant:
+            k = self.redundant.index(feature)
+            self.combos = np.delete(self.combos, k, axis=1)
+            del self.redundant[k]
+            return
+
+        j = self.basis.index(feature)
+        if self.combos.size and np.max(np.abs(self.combos[j])) > _RANK_TOL:
+            #Swap in the redundant feature that loads most on `feature`; the span is unchanged
+            k = int(np.argmax(np.abs(self.combos[j])))
+            scale = np.sqrt(self.fold.scale)
+            combo = self.combos[:, k] * scale[self.redundant[k]] / scale[self.basis]  #Unnormalized
+            inverse = np.eye(len(self.basis))
+            inverse[:, j] = -combo / combo[j]
+            inverse[j, j] = 1 / combo[j]
+            self.gram_inv = inverse @ self.gram_inv @ inverse.T
+            self.coef = inverse @ self.coef
+            normalized = np.eye(len(self.basis))
+            normalized[:, j] = -self.combos[:, k] / self.combos[j, k]
+            normalized[j, j] = 1 / self.combos[j, k]
+            self.combos = np.delete(normalized @ self.combos, k, axis=1)
+            self.basis[j] = self.redundant.pop(k)
+            return
+
+        pivot = self.gram_inv[j, j]
+        shift = self.coef[j] / pivot
+        self.residual = self.residual + shift * (self.X_score[:, self.basis] @ self.gram_inv[:, j])
+        self.coef = np.delete(self.coef - shift * self.gram_inv[:, j], j)
+        self.gram_inv = self.gram_inv - np.outer(self.gram_inv[:, j], self.gram_inv[j]) / pivot
+        self.gram_inv = np.delete(np.delete(self.gram_inv, j, axis=0), j, axis=1)
+        self.combos = np.delete(self.combos, j, axis=0)
+        del self.basis[j]
+
+
+def _backward(folds, n_features):
+    #Dropping basis feature j changes the coefficients by b_j / G^-1_jj times column j
+    #of G^-1, so every candidate is scored from the current inverse without a refit.
+    active = list(range(n_features))
+    states = [_BackwardState(fold) for fold in folds]
+    steps = [(tuple(active), np.array([state.score() for state in states]))]
+
+    while len(active) > 1:
+        scores = np.array([state.drop_scores(active) for state in states])
+        drop = _first_best(scores.mean(axis=0))
+        for state in states:
+            state.drop(active[drop])
+
+        del active[drop]
+        steps.append((tuple(active), scores[:, drop]))
+
+    return steps
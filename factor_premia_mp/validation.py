@@ -0,0 +1,201 @@
+"""Time-series cross-validation of the MPSTANCE regressions.
+
+Splits never shuffle months. Walk-forward splits train on the past only;
+blocked splits hold out contiguous blocks; purged splits also drop the rows
+within `purge` months before and `embargo` months after each test block from its
+training set, so lagged regressors and persistent errors do not leak across the
+boundary. Every splitter returns (train, test) index arrays that `StepwiseSelector`
+accepts as `cv`.
+
+`cross_validate_ols` forms X'X and X'y of the whole sample once; each fold's
+training cross-products are the full ones minus the rows the fold leaves out
+(or are summed directly when the fold keeps fewer rows than it drops).
+`cross_validate_stepwise` runs the whole selection inside each training set, so
+its out-of-sample R² includes the cost of choosing the features. Folds run on a
+process pool with the panel in shared memory when `n_jobs` is not 1.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.shared import shared_pool, worker_array
+from factor_premia_mp.stepwise import StepwiseSelector, kfold_splits
+
+CrossValidation = namedtuple('CrossValidation', ['folds', 'predictions', 'oos_r2'])
+
+
+def walk_forward_splits(n_obs, n_splits=5, test_size=None, min_train=None, max_train=None, gap=0):
+    """Train on the rows before each of `n_splits` consecutive test blocks at the end of the sample.
+
+    Test blocks have `test_size` rows (default: the rows after `min_train` and `gap`,
+    divided evenly). `min_train`, which defaults to `n_obs // (n_splits + 1)`, is the
+    fewest training rows of the first split. The training window expands, or rolls with
+    at most `max_train` rows; `gap` rows between training and test are left out.
+    """
+    if min_train is None:
+        min_train = n_obs // (n_splits + 1)
+    if test_size is None:
+        test_size = (n_obs - min_train - gap) // n_splits
+    first_test = n_obs - n_splits * test_size
+    if test_size < 1 or first_test - gap < max(min_train, 1):
+        raise ValueError(f'Cannot make {n_splits} walk-forward splits of {test_size} rows with at least '
+                         f'{min_train} training rows from {n_obs} rows.')
+
+    splits = []
+    for start in range(first_test, n_obs, test_size):
+        stop_train = start - gap
+        start_train = 0 if max_train is None else max(0, stop_train - max_train)
+        splits.append((np.arange(start_train, stop_train), np.arange(start, start + test_size)))
+    return splits
+
+
+def blocked_splits(n_obs, n_splits=5):
+    """Contiguous test blocks; training uses every other row, before and after the block."""
+    return kfold_splits(n_obs, n_splits)
+
+
+def purged_splits(n_obs, n_splits=5, purge=12, embargo=12):
+    """Blocked splits without the `purge` rows before and `embargo` rows after each test block in training."""
+    splits = []
+    for _, test in kfold_splits(n_obs, n_splits):
+        start, stop = test[0], test[-1] + 1
+        keep = np.ones(n_obs, dtype=bool)
+        keep[max(0, start - purge):min(n_obs, stop + embargo)] = False
+        splits.append((np.flatnonzero(keep), test))
+    return splits
+
+
+SPLITTERS = {
+    'walk_forward': walk_forward_splits,
+    'blocked': blocked_splits,
+    'purged': purged_splits,
+}
+
+
+def make_splits(kind, n_obs, **options):
+    """Splits of one of the `SPLITTERS` kinds."""
+    return SPLITTERS[kind](n_obs, **options)
+
+
+def _fold_cross_products(X, y, xx, xy, train):
+    """X'X and X'y of the training rows, downdated from the full sample when that is cheaper."""
+    n_obs = len(X)
+    if 2 * len(train) >= n_obs:
+        left_out = np.ones(n_obs, dtype=bool)
+        left_out[train] = False
+        X_out, y_out = X[left_out], y[left_out]
+        return xx - X_out.T @ X_out, xy - X_out.T @ y_out
+    X_train = X[train]
+    return X_train.T @ X_train, X_train.T @ y[train]
+
+
+def _score(y_train_mean, y_test, prediction):
+    sse = np.sum((y_test - prediction) ** 2)
+    return {
+        'r_squared': 1 - sse / np.sum((y_test - y_test.mean()) ** 2),
+        'mse': sse / len(y_test),
+        'sse': sse,
+        'sst_train_mean': np.sum((y_test - y_train_mean) ** 2),
+    }
+
+
+def _ols_fold(X, y, xx, xy, split):
+    train, test = split
+    xx_train, xy_train = _fold_cross_products(X, y, xx, xy, train)
+    coef = np.linalg.pinv(xx_train, hermitian=True) @ xy_train
+    prediction = X[test] @ coef
+    row = {'train_nobs': len(train), 'test_nobs': len(test), **_score(y[train].mean(), y[test], prediction)}
+    return row, prediction
+
+
+def _ols_task(task):
+    return _ols_fold(worker_array('X'), worker_array('y'), worker_array('xx'), worker_array('xy'), task)
+
+
+def _stepwise_fold(X, y, split, options):
+    train, test = split
+    k_features, forward, inner_cv, add_constant = options
+    selector = StepwiseSelector(k_features=k_features, forward=forward, cv=inner_cv)
+    first = 1 if add_constant else 0  #The constant is always kept, outside the selection
+    selector.fit(X[train, first:], y[train])
+    columns = list(range(first)) + [first + i for i in selector.k_feature_idx_]
+
+    X_fold = X[:, columns]
+    X_train = X_fold[train]
+    coef = np.linalg.pinv(X_train.T @ X_train, hermitian=True) @ (X_train.T @ y[train])
+    prediction = X_fold[test] @ coef
+    row = {'train_nobs': len(train), 'test_nobs': len(test), **_score(y[train].mean(), y[test], prediction),
+           'inner_score': selector.k_score_, 'features': selector.k_feature_idx_}
+    return row, prediction
+
+
+def _stepwise_task(task):
+    split, options = task
+    return _stepwise_fold(worker_array('X'), worker_array('y'), split, options)
+
+
+def _prepare(y, X, add_constant):
+    index = y.index if hasattr(y, 'index') else pd.RangeIndex(len(y))
+    terms = list(X.columns) if hasattr(X, 'columns') else [f'x{i}' for i in range(np.shape(X)[1])]
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if add_constant:
+        X = np.column_stack([np.ones(len(X)), X])
+    return index, terms, X, y
+
+
+def _collect(rows_and_predictions, splits, index):
+    rows = [row for row, _ in rows_and_predictions]
+    folds = pd.DataFrame(rows)
+    folds.index.name = 'fold'
+    test = np.concatenate([test for _, test in splits])
+    prediction = np.concatenate([prediction for _, prediction in rows_and_predictions])
+    fold = np.repeat(np.arange(len(splits)), [len(test) for _, test in splits])
+    predictions = pd.DataFrame({'fold': fold, 'prediction': prediction}, index=index[test])
+    oos_r2 = 1 - folds['sse'].sum() / folds['sst_train_mean'].sum()
+    return CrossValidation(folds, predictions, oos_r2)
+
+
+def cross_validate_ols(y, X, splits, add_constant=True, n_jobs=1):
+    """Out-of-sample fit of the OLS of `y` on `X` for each (train, test) split.
+
+    `folds` has train_nobs, test_nobs, r_squared (against the test mean, as
+    `sklearn.metrics.r2_score`), mse, sse and sst_train_mean per fold; `predictions` holds
+    each test row's forecast, and `oos_r2` pools all folds against the training means,
+    i.e. how much the model beats the historical average out of sample.
+    """
+    index, _, X, y = _prepare(y, X, add_constant)
+    splits = [(np.asarray(train), np.asarray(test)) for train, test in splits]
+    xx, xy = X.T @ X, X.T @ y
+
+    if n_jobs == 1:
+        results = [_ols_fold(X, y, xx, xy, split) for split in splits]
+    else:
+        with shared_pool(n_jobs, X=X, y=y, xx=xx, xy=xy) as pool:
+            results = list(pool.map(_ols_task, splits))
+    return _collect(results, splits, index)
+
+
+def cross_validate_stepwise(y, X, splits, k_features='best', forward=True, inner_cv=0, add_constant=True,
+                            n_jobs=1):
+    """Out-of-sample fit of stepwise selection followed by OLS, selecting within each training set.
+
+    `inner_cv` is the `cv` of the `StepwiseSelector` run on each training set (0 scores
+    in-sample R², as in the notebook). The result is laid out as in `cross_validate_ols`,
+    with the selection's own score and the selected feature names added per fold.
+    """
+    index, terms, X, y = _prepare(y, X, add_constant)
+    splits = [(np.asarray(train), np.asarray(test)) for train, test in splits]
+    options = (k_features, forward, inner_cv, add_constant)
+
+    if n_jobs == 1:
+        results = [_stepwise_fold(X, y, split, options) for split in splits]
+    else:
+        with shared_pool(n_jobs, X=X, y=y) as pool:
+            results = list(pool.map(_stepwise_task, [(split, options) for split in splits]))
+
+    for row, _ in results:
+        row['features'] = tuple(terms[i] for i in row['features'])
+    return _collect(results, splits, index)
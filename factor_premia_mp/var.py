@@ -0,0 +1,140 @@
+"""VAR and local projections of MPSTANCE and the factor premia.
+
+Every equation of a VAR(p) shares the regressor matrix [const, y_{t-1}, ..., y_{t-p}],
+so all equations are one least-squares solve with a matrix right-hand side.
+Local projections (Jordan, 2005) regress y_{t+h} on the shock at t and p lags of
+every variable; all responses at a horizon share X'X, which moves from one horizon
+to the next by removing the last row's outer product, and all horizons are solved
+together in one stacked solve.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+VARResult = namedtuple('VARResult', ['coefs', 'intercept', 'sigma', 'resid', 'names', 'lags', 'zz_inv'])
+
+
+def _lagged_regressors(values, lags):
+    """[const, y_{t-1}, ..., y_{t-lags}] for t = lags..T-1, shape (T - lags, 1 + m * lags)."""
+    n_obs = values.shape[0]
+    blocks = [values[lags - lag:n_obs - lag] for lag in range(1, lags + 1)]
+    return np.column_stack([np.ones(n_obs - lags)] + blocks)
+
+
+def fit_var(data, lags=12):
+    """VAR(`lags`) with a constant for the columns of `data`, estimated equation by equation by OLS.
+
+    `coefs` has shape (lags, m, m) with coefs[i - 1][response, impulse] the coefficient on
+    lag i; `sigma` is the residual covariance with a degrees-of-freedom correction.
+    """
+    names = list(data.columns)
+    values = np.asarray(data, dtype=float)
+    Z = _lagged_regressors(values, lags)
+    Y = values[lags:]
+
+    zz_inv = np.linalg.pinv(Z.T @ Z, hermitian=True)
+    B = zz_inv @ (Z.T @ Y)  #(1 + m * lags, m), one column per equation
+    resid = Y - Z @ B
+    sigma = resid.T @ resid / (len(Y) - Z.shape[1])
+
+    n_vars = values.shape[1]
+    coefs = B[1:].reshape(lags, n_vars, n_vars).transpose(0, 2, 1)
+    resid = pd.DataFrame(resid, index=data.index[lags:], columns=names)
+    return VARResult(coefs, B[0], sigma, resid, names, lags, zz_inv)
+
+
+def _ma_coefficients(coefs, horizon):
+    """MA(∞) matrices Φ_0..Φ_horizon for a stack of coefficient arrays (..., p, m, m)."""
+    lags, n_vars = coefs.shape[-3], coefs.shape[-1]
+    phi = np.zeros(coefs.shape[:-3] + (horizon + 1, n_vars, n_vars))
+    phi[..., 0, :, :] = np.eye(n_vars)
+    for h in range(1, horizon + 1):
+        for i in range(1, min(h, lags) + 1):
+            phi[..., h, :, :] += coefs[..., i - 1, :, :] @ phi[..., h - i, :, :]
+    return phi
+
+
+def var_irf(result, horizon=24, orthogonalized=True, n_draws=1000, alpha=0.05, seed=None):
+    """Impulse responses with Monte Carlo confidence bands.
+
+    Coefficient draws come from the asymptotic normal distribution vec(B) ~ N(vec(B̂),
+    Σ ⊗ (Z'Z)^-1), all drawn and propagated as one batch; orthogonalized responses use
+    the Cholesky factor of the estimated Σ. Returns a tidy frame indexed by
+    (horizon, response, impulse) with irf, lower and upper.
+    """
+    lags, n_vars = result.lags, len(result.names)
+    chol_sigma = np.linalg.cholesky(result.sigma)
+    impact = chol_sigma if orthogonalized else np.eye(n_vars)
+
+    irf = _ma_coefficients(result.coefs, horizon) @ impact
+
+    #Draws of the slope block only: B = B̂ + L_Z N L_Σ'
+    rng = np.random.default_rng(seed)
+    slope_cov = result.zz_inv[1:, 1:]
+    eigenvalues, eigenvectors = np.linalg.eigh(slope_cov)
+    root = eigenvectors * np.sqrt(np.clip(eigenvalues, 0, None))
+    noise = rng.standard_normal((n_draws, slope_cov.shape[0], n_vars))
+    B = result.coefs.transpose(0, 2, 1).reshape(lags * n_vars, n_vars) + root @ noise @ chol_sigma.T
+    draws = _ma_coefficients(B.reshape(n_draws, lags, n_vars, n_vars).transpose(0, 1, 3, 2), horizon) @ impact
+
+    lower, upper = np.quantile(draws, [alpha / 2, 1 - alpha / 2], axis=0)
+    index = pd.MultiIndex.from_product([range(horizon + 1), result.names, result.names],
+                                       names=['horizon', 'response', 'impulse'])
+    return pd.DataFrame({'irf': irf.ravel(), 'lower': lower.ravel(), 'upper': upper.ravel()}, index=index)
+
+
+def _newey_west(scores, max_lag):
+    """Newey-West long-run variance of each column of `scores` (n, m)."""
+    variance = np.einsum('tm,tm->m', scores, scores)
+    for lag in range(1, max_lag + 1):
+        weight = 1 - lag / (max_lag + 1)
+        variance += 2 * weight * np.einsum('tm,tm->m', scores[lag:], scores[:-lag])
+    return variance
+
+
+def local_projections(data, shock='MPSTANCE', responses=None, horizon=24, lags=12, alpha=0.05):
+    """Jordan local projections of `responses` on a one-unit change in `shock`.
+
+    For each h, y_{t+h} = a + b_h shock_t + Σ_{i=1..lags} c_i' Y_{t-i} + e, with Y all columns
+    of `data`. Standard errors are Newey-West with h + 1 lags. Returns a tidy frame
+    indexed by (horizon, response) with irf, std_err, lower, upper and nobs.
+    """
+    responses = list(data.columns) if responses is None else list(responses)
+    values = np.asarray(data, dtype=float)
+    X = np.column_stack([values[lags:, data.columns.get_loc(shock)], _lagged_regressors(values, lags)])
+    Y = np.asarray(data[responses], dtype=float)[lags:]
+    n_obs, n_terms = X.shape
+
+    #X'X for the sample of each horizon: drop the last row's outer product as h grows
+    xx = np.empty((horizon + 1, n_terms, n_terms))
+    xy = np.empty((horizon + 1, n_terms, len(responses)))
+    xx[0] = X.T @ X
+    for h in range(horizon + 1):
+        if h:
+            last = X[n_obs - h]
+            xx[h] = xx[h - 1] - np.outer(last, last)
+        xy[h] = X[:n_obs - h].T @ Y[h:]
+
+    xx_inv = np.linalg.pinv(xx, hermitian=True)
+    coef = xx_inv @ xy  #(horizon + 1, n_terms, n_responses), every horizon and response at once
+
+    std_err = np.empty((horizon + 1, len(responses)))
+    for h in range(horizon + 1):
+        resid = Y[h:] - X[:n_obs - h] @ coef[h]
+        influence = X[:n_obs - h] @ xx_inv[h, 0]  #Row of (X'X)^-1 for the shock coefficient
+        std_err[h] = np.sqrt(_newey_west(influence[:, None] * resid, h + 1))
+
+    nobs = n_obs - np.arange(horizon + 1)
+    critical = stats.norm.ppf(1 - alpha / 2)
+    irf = coef[:, 0, :]
+    index = pd.MultiIndex.from_product([range(horizon + 1), responses], names=['horizon', 'response'])
+    return pd.DataFrame({
+        'irf': irf.ravel(),
+        'std_err': std_err.ravel(),
+        'lower': (irf - critical * std_err).ravel(),
+        'upper': (irf + critical * std_err).ravel(),
+        'nobs': np.repeat(nobs, len(responses)),
+    }, index=index)
@@ -0,0 +1,126 @@
+"""Streaming reader for the Century of Factor Premia workbook.
+
+`pd.read_excel` materializes the whole sheet as object columns before the header
+fix and the float cast. `iter_factor_premia` instead walks the sheet row by row
+with openpyxl in read-only mode, finds the header row (the first row with several
+text cells followed by a row that starts with a date), and writes the requested
+columns of the rows in the requested date range straight into float64 buffers of
+`chunk_rows` rows. Memory therefore depends on the chunk and the projection, not
+on the size of the file.
+
+Vendor sheets carry thousands of formatted but empty rows after the data, so
+reading stops after `max_blank_rows` consecutive empty rows.
+"""
+
+import datetime as dt
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from factor_premia_mp.instrument import count, stage
+
+
+def _is_date(value):
+    return isinstance(value, (dt.datetime, dt.date, pd.Timestamp))
+
+
+def _to_float(value):
+    if value is None:
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):  #Text such as "#N/A"
+        return np.nan
+
+
+def _find_header(rows, min_labels=2):
+    """Header cells and the first data row, from an iterator of row tuples."""
+    candidate = None
+    for row in rows:
+        if not any(cell is not None for cell in row):
+            continue
+        if candidate is not None and _is_date(row[0]):
+            return candidate, row
+        labels = sum(isinstance(cell, str) and bool(cell.strip()) for cell in row)
+        candidate = row if labels >= min_labels else None
+    raise ValueError('No header row followed by dated rows was found.')
+
+
+def _frame(dates, values, names):
+    frame = pd.DataFrame(values, columns=names)
+    frame.insert(0, 'Date', pd.to_datetime(np.array(dates, dtype='datetime64[us]')))
+    return frame
+
+
+def iter_factor_premia(path, columns=None, start=None, end=None, chunk_rows=4096, sheet=0,
+                       max_blank_rows=100, assume_sorted=True):
+    """Yield the factor premia as DataFrames of at most `chunk_rows` rows: Date plus float columns.
+
+    `columns` selects factor columns by header (default all); `start` and `end` bound the
+    dates (inclusive). `sheet` is a name or position (the first sheet by default, as in
+    `pd.read_excel`). With `assume_sorted` the scan stops at the first date after `end`.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.worksheets[sheet] if isinstance(sheet, int) else workbook[sheet]
+        rows = worksheet.iter_rows(values_only=True)
+        header, first = _find_header(rows)
+
+        names = [str(cell).strip() if cell is not None else '' for cell in header]
+        factor_names = [name for name in names[1:] if name]
+        selected = factor_names if columns is None else list(columns)
+        missing = [name for name in selected if name not in factor_names]
+        if missing:
+            raise KeyError(f'Columns not in the workbook: {missing}')
+        positions = [names.index(name) for name in selected]
+
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+
+        dates = []
+        values = np.empty((chunk_rows, len(selected)))
+        blank = 0
+        for row in chain([first], rows):
+            if not any(cell is not None for cell in row):
+                blank += 1
+                if blank >= max_blank_rows:
+                    break
+                continue
+            blank = 0
+
+            date = row[0]
+            if not _is_date(date):
+                count('rows_skipped')  #Footnotes or stray text below the data
+                continue
+            date = pd.Timestamp(date)
+            if start is not None and date < start:
+                continue
+            if end is not None and date > end:
+                if assume_sorted:
+                    break
+                continue
+
+            values[len(dates)] = [_to_float(row[i]) if i < len(row) else np.nan for i in positions]
+            dates.append(date.to_datetime64())
+            if len(dates) == chunk_rows:
+                yield _frame(dates, values, selected)
+                dates = []
+                values = np.empty((chunk_rows, len(selected)))
+
+        if dates:
+            yield _frame(dates, values[:len(dates)], selected)
+    finally:
+        workbook.close()
+
+
+@stage('clean')
+def read_factor_premia_streaming(path, columns=None, start=None, end=None, chunk_rows=4096, sheet=0):
+    """The cleaned factor premia frame (Date plus float columns) from `iter_factor_premia`."""
+    chunks = list(iter_factor_premia(path, columns, start, end, chunk_rows, sheet))
+    if not chunks:
+        names = list(columns) if columns is not None else []
+        return _frame([], np.empty((0, len(names))), names)
+    return pd.concat(chunks, ignore_index=True)
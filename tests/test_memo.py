@@ -0,0 +1,30 @@
+from functools import partial
+
+import numpy as np
+
+from factor_premia_mp.memo import MemoCache, content_key
+from factor_premia_mp.stepwise import StepwiseSelector
+from factor_premia_mp.validation import walk_forward_splits
+
+
+def _data():
+    rng = np.random.default_rng(0)
+    X = rng.standard_normal((60, 3))
+    return X, X @ [1.0, 0.5, 0.0] + rng.standard_normal(60)
+
+
+def test_partials_differing_in_keywords_get_different_keys():
+    X, y = _data()
+    three = StepwiseSelector(cv=partial(walk_forward_splits, n_splits=3))
+    eight = StepwiseSelector(cv=partial(walk_forward_splits, n_splits=8))
+    assert content_key(three.fit, (X, y)) != content_key(eight.fit, (X, y))
+    assert content_key(three.fit, (X, y)) == content_key(
+        StepwiseSelector(cv=partial(walk_forward_splits, n_splits=3)).fit, (X, y))
+
+
+def test_memoized_call_does_not_reuse_another_partials_result(tmp_path):
+    cache = MemoCache(tmp_path)
+    first = cache.call(lambda cv: len(cv(20)), partial(walk_forward_splits, n_splits=3))
+    second = cache.call(lambda cv: len(cv(20)), partial(walk_forward_splits, n_splits=4))
+    assert (first, second) == (3, 4)
+    assert cache.hits == 0
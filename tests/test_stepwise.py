@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+import pytest
+import statsmodels.api as sm
+
+from factor_premia_mp.stepwise import StepwiseSelector
+
+mlxtend = pytest.importorskip('mlxtend.feature_selection')
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+def _design(seed):
+    rng = np.random.default_rng(seed)
+    X = pd.DataFrame(rng.standard_normal((120, 6)), columns=[f'x{i}' for i in range(6)])
+    y = X['x1'] + 0.3 * X['x4'] - 0.2 * X['x5'] + rng.standard_normal(120)
+    return sm.add_constant(X), y
+
+
+@pytest.mark.parametrize('forward', [True, False])
+@pytest.mark.parametrize('cv', [0, 5])
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_matches_mlxtend_with_a_constant(forward, cv, seed):
+    X, y = _design(seed)
+    reference = mlxtend.SequentialFeatureSelector(
+        linear_model.LinearRegression(), k_features='best', forward=forward, scoring='r2', cv=cv,
+        fixed_features=(0,)).fit(X, y)
+    selector = StepwiseSelector(k_features='best', forward=forward, cv=cv).fit(X, y)
+
+    assert selector.k_feature_names_ == tuple(reference.k_feature_names_)
+    assert 'const' in selector.k_feature_names_
+    assert selector.k_score_ == pytest.approx(reference.k_score_, abs=1e-10)
+    for k, subset in reference.subsets_.items():
+        assert selector.subsets_[k]['feature_idx'] == tuple(sorted(subset['feature_idx']))
+        assert selector.subsets_[k]['avg_score'] == pytest.approx(subset['avg_score'], abs=1e-10)